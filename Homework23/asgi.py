@@ -14,3 +14,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Homework23.settings')
 
 application = get_asgi_application()
+
+# warm_up() тут не викликається: під uvicorn модуль імпортується всередині
+# циклу подій, і синхронні запити до бази (знімок каталогу) падають із
+# SynchronousOnlyOperation. Прогрів — хук gunicorn `when_ready` (див. wsgi.py).
+
+# Обробник сигналу для `manage.py profile_worker <pid>` (успадковується воркерами)
+from custom_app.profiling import install_signal_handler  # noqa: E402
+
+install_signal_handler()
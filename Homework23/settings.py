@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,11 +45,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'custom_app.tracing.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'custom_app.sharding.TenantMiddleware',
+    'custom_app.middleware.SamplingProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'custom_app.middleware.CustomMetricsMiddleware',
@@ -59,7 +64,7 @@ ROOT_URLCONF = 'Homework23.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'custom_app.tracing.TracedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -86,6 +91,81 @@ DATABASES = {
     }
 }
 
+# ---- Шарди каталогу: окремий файл SQLite (і окремий writer-лок) на тенанта ----
+# Вмикаються явно: кількість шардів задає змінна оточення CATALOGUE_SHARDS
+# (за замовчуванням 0 — лише `default`; тести використовують два шарди).
+# Після зміни кількості шардів таблиці створює `manage.py migrate_shards`
+# (звичайний `migrate` оновлює лише `default`); доки шард не мігровано,
+# TenantMiddleware відповідає на запити його тенанта 404. Дані без тенанта
+# (та користувачі, сесії, адмін-журнал) залишаються в `default`.
+TESTING = sys.argv[1:2] == ['test']
+CATALOGUE_SHARDS = int(os.environ.get('CATALOGUE_SHARDS', 2 if TESTING else 0))
+for shard_number in range(1, CATALOGUE_SHARDS + 1):
+    DATABASES[f'catalogue_{shard_number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'catalogue_{shard_number}.sqlite3',
+    }
+
+DATABASE_ROUTERS = ['custom_app.sharding.TenantRouter']
+
+SHARDING = {
+    'HEADER': 'X-Tenant',
+    'DEFAULT_SHARD': 'default',
+    # ключ тенанта -> аліас бази
+    'TENANTS': {f'tenant{number}': f'catalogue_{number}' for number in range(1, CATALOGUE_SHARDS + 1)},
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Сховище ключів Idempotency-Key: обмежене (MAX_ENTRIES) та з терміном життя.
+    # У продакшні варто використати спільний для воркерів бекенд (Redis/Memcached).
+    'idempotency': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'idempotency',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# ---- Налаштування ідемпотентних запитів (Idempotency-Key) ----
+IDEMPOTENCY = {
+    'CACHE': 'idempotency',
+    'TTL': 60 * 60 * 24,
+    'LOCK_TIMEOUT': 30,
+}
+
+# ---- Спільний знімок каталогу (memory-mapped файл для читання ProductViewSet) ----
+CATALOGUE_SNAPSHOT = {
+    'ENABLED': False,
+    'PATH': BASE_DIR / 'catalogue.snapshot',
+    'REBUILD_DELAY': 1.0,  # None — перебудова лише командою build_catalogue_snapshot
+}
+
+# ---- Трасування запитів (Server-Timing та OTLP JSON-файл) ----
+TRACING = {
+    'ENABLED': DEBUG,
+    'SERVER_TIMING': True,
+    'EXPORT_PATH': None,  # наприклад, BASE_DIR / 'traces.jsonl'
+    'SERVICE_NAME': 'Homework23',
+}
+
+# ---- Статистичний профайлер (ендпоїнт /api/profile/, X-Profile, profile_worker) ----
+PROFILING = {
+    'INTERVAL': 0.005,
+    'REQUEST_INTERVAL': 0.001,
+    'MAX_SECONDS': 60,
+    'HEADER': 'X-Profile',
+}
+
+
+# Тест-раннер: паралельний запуск, швидкий хешер паролів (див. custom_app.testing)
+TEST_RUNNER = 'custom_app.testing.FastTestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -14,3 +14,16 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Homework23.settings')
 
 application = get_wsgi_application()
+
+# warm_up() тут не викликається: імпорт модуля має лишатися дешевим (його
+# виконують і `manage.py startup_profile`, і кожен воркер без --preload).
+# Прогрів до fork воркерів — у хуку gunicorn при --preload (gunicorn.conf.py):
+#
+#     def when_ready(server):
+#         from custom_app.warmup import warm_up
+#         warm_up()
+
+# Обробник сигналу для `manage.py profile_worker <pid>` (успадковується воркерами)
+from custom_app.profiling import install_signal_handler  # noqa: E402
+
+install_signal_handler()
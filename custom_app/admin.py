@@ -1,7 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Product, Review, CustomUser
-from .forms import UserCreationForm, CustomUserCreationForm
+from django.contrib import messages
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponseRedirect
+from .models import Product, Review, CustomUser, ConcurrentUpdateError
+from .sharding import current_shard
 
 
 # Реєструємо кастомну модель користувача
@@ -13,15 +17,24 @@ class CustomUserAdmin(admin.ModelAdmin):
     Розширює стандартну функціональність, додаючи кастомні поля,
     такі як 'phone_number', і використовує спеціалізовані форми.
     """
-    # Використовуємо кастомну форму для створення
-    add_form = CustomUserCreationForm
-    form = CustomUserCreationForm
     model = CustomUser
     list_display = ['username', 'email', 'phone_number', 'is_staff']
     fieldsets = UserAdmin.fieldsets + (
         (('Кастомні поля'), {'fields': ('phone_number',)}),
     )
 
+    def get_form(self, request, obj=None, **kwargs):
+        """
+        Використовує кастомну форму `CustomUserCreationForm`.
+
+        Модуль форм імпортується при першому відкритті форми, а не під час
+        автопошуку адмінки на старті процесу.
+        """
+        from .forms import CustomUserCreationForm
+
+        kwargs.setdefault('form', CustomUserCreationForm)
+        return super().get_form(request, obj, **kwargs)
+
 
 # Inline-моделі
 class ReviewInline(admin.TabularInline):
@@ -36,6 +49,13 @@ class ReviewInline(admin.TabularInline):
     # Обмеження полів для відображення
     fields = ('text', 'rating')
 
+    def get_queryset(self, request):
+        """
+        Завантажує продукт разом із відгуками, щоб рендеринг inline
+        не виконував окремий запит на кожен відгук.
+        """
+        return super().get_queryset(request).with_product()
+
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -58,23 +78,80 @@ class ProductAdmin(admin.ModelAdmin):
     # Кастомні дії
     actions = ['set_inactive', 'make_names_uppercase']
 
+    def changelist_view(self, request, extra_context=None):
+        """
+        Показує шард каталогу, з яким працює адмінка.
+
+        Шард визначає `TenantMiddleware`; змінити його можна параметром
+        `?tenant=<ключ>` (порожнє значення — шард за замовчуванням).
+        """
+        extra_context = {**(extra_context or {}), 'subtitle': f'Шард каталогу: {current_shard()}'}
+        return super().changelist_view(request, extra_context)
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        """
+        Обробляє конфлікт версій, що виник між `clean()` форми і `save_model()`.
+
+        Транзакцію сторінки відкочено; замість відповіді 500 користувача
+        повертає на сторінку продукту з повідомленням про помилку.
+        """
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except ConcurrentUpdateError:
+            self.message_user(
+                request, 'Продукт змінено іншим користувачем під час збереження. Зміни не збережено.',
+                messages.ERROR,
+            )
+            return HttpResponseRedirect(request.get_full_path())
+
+    def get_form(self, request, obj=None, **kwargs):
+        """
+        Використовує `ProductAdminForm` з прихованим номером версії, щоб
+        збереження застарілої форми не перезаписувало чужі зміни.
+        """
+        from .forms import ProductAdminForm
+
+        kwargs.setdefault('form', ProductAdminForm)
+        return super().get_form(request, obj, **kwargs)
+
     @admin.action(description='Зробити вибрані продукти неактивними')
     def set_inactive(self, request, queryset):
         """
         Кастомна дія: Встановлює поле `is_active` у `False` для вибраних об'єктів.
+
+        Версія збільшується, тому паралельні збереження цих продуктів
+        отримають конфлікт замість мовчазного перезапису `is_active`.
         """
-        updated = queryset.update(is_active=False)
+        from . import snapshot, stats
+
+        with transaction.atomic(using=queryset.db):
+            updated = queryset.filter(is_active=True).update(
+                is_active=False, version=F('version') + 1
+            )
+            # update() не надсилає сигналів, тому оновлюємо статистику та знімок вручну
+            stats.product_activity_changed(True, False, count=updated)
+            snapshot.schedule_rebuild(queryset.db)
         self.message_user(request, f'Зроблено неактивними {updated} продуктів.')
 
     @admin.action(description='Перетворити імена на UPPERCASE')
-    def makes_names_uppercase(self, request, queryset):
+    def make_names_uppercase(self, request, queryset):
         """
-        Кастомна дія: Зберігає кожен вибраний об'єкт.
+        Кастомна дія: Зберігає поле `name` кожного вибраного об'єкта.
 
-        Примітка: Припускається, що метод `save()` моделі Product містить
-        логіку, яка автоматично перетворює ім'я (name) на верхній регістр
-        або виконує іншу необхідну обробку.
+        Примітка: Поле `name` (UpperCaseCharField) перетворює значення на
+        верхній регістр у `pre_save`. Записується лише колонка `name`
+        з перевіркою версії; продукти, змінені паралельно, пропускаються.
         """
+        updated = conflicts = 0
         for obj in queryset:
-            obj.save()
-        self.message_user(request, f'Оновлено {queryset.count()} продуктів.')
+            try:
+                obj.save(update_fields=['name'])
+                updated += 1
+            except ConcurrentUpdateError:
+                conflicts += 1
+        self.message_user(request, f'Оновлено {updated} продуктів.')
+        if conflicts:
+            self.message_user(
+                request, f'Пропущено {conflicts} продуктів, змінених іншим користувачем.',
+                level=messages.WARNING,
+            )
@@ -0,0 +1,112 @@
+from datetime import timedelta
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+from . import snapshot, stats
+from .models import ArchivedProduct, ArchivedReview, Product, ProductReviewStats, Review
+
+# Кількість продуктів, що переносяться в архів за одну транзакцію
+DEFAULT_BATCH_SIZE = 500
+
+# Поля, які копіюються в архівні таблиці (в однаковому порядку)
+PRODUCT_FIELDS = ('id', 'name', 'details', 'is_active', 'created_at', 'version')
+REVIEW_FIELDS = ('id', 'product_id', 'text', 'rating')
+
+
+def archivable_products(inactive=True, older_than_days=None):
+    """
+    Повертає QuerySet продуктів, які підлягають архівації.
+
+    :param inactive: Архівувати неактивні продукти.
+    :param older_than_days: Архівувати продукти, створені раніше ніж N днів тому.
+    :return: QuerySet продуктів (порожній, якщо не задано жодної умови).
+    """
+    condition = Q()
+    if inactive:
+        condition |= Q(is_active=False)
+    if older_than_days is not None:
+        condition |= Q(created_at__lt=timezone.now() - timedelta(days=older_than_days))
+    if not condition:
+        return Product.objects.none()
+    return Product.objects.filter(condition)
+
+
+def _delete_archived(using, products, reviews):
+    """
+    Видаляє скопійовані в архів рядки та застосовує всі побічні ефекти видалення.
+
+    Рядки видаляються трьома запитами `DELETE ... WHERE ... IN (...)` через
+    `connection.cursor()`, без ORM-каскаду та сигналів для кожного рядка,
+    тому все, що інакше зробили б сигнали (rollup-статистика, знімок
+    каталогу), виконується тут, згрупованими змінами з уже скопійованих рядків.
+
+    :param using: Аліас бази (шарду).
+    :param products: Скопійовані `ArchivedProduct`.
+    :param reviews: Скопійовані `ArchivedReview`.
+    """
+    connection = connections[using]
+    pks = [product.pk for product in products]
+    placeholders = ', '.join(['%s'] * len(pks))
+    with connection.cursor() as cursor:
+        for model, column in ((Review, 'product_id'), (ProductReviewStats, 'product_id'), (Product, 'id')):
+            table = connection.ops.quote_name(model._meta.db_table)
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {connection.ops.quote_name(column)} IN ({placeholders})', pks,
+            )
+
+    stats.products_removed(products)
+    stats.reviews_removed(((review.product_id, review.rating) for review in reviews), per_product=False)
+    snapshot.schedule_rebuild(using)
+
+
+def archive_batch(pks, queryset=None):
+    """
+    Переносить продукти з указаними ключами та їхні відгуки в архів.
+
+    Копіювання та видалення виконуються в одній транзакції. Умова архівації
+    (`queryset`) перевіряється ще раз усередині транзакції, тож продукт,
+    змінений після вибору ключів, не потрапляє в архів. Видалення та його
+    побічні ефекти — у `_delete_archived()`.
+
+    :param pks: Список первинних ключів продуктів.
+    :param queryset: QuerySet з умовою архівації (за замовчуванням усі продукти).
+    :return: Кортеж (кількість продуктів, кількість відгуків).
+    """
+    queryset = Product.objects.all() if queryset is None else queryset
+    using = router.db_for_write(Product)
+    with transaction.atomic(using=using):
+        copied_products = ArchivedProduct.objects.bulk_create(
+            ArchivedProduct(**dict(zip(PRODUCT_FIELDS, row)))
+            for row in queryset.filter(pk__in=pks).values_list(*PRODUCT_FIELDS)
+        )
+        if not copied_products:
+            return 0, 0
+        reviews = Review.objects.filter(product_id__in=[product.pk for product in copied_products])
+        copied_reviews = ArchivedReview.objects.bulk_create(
+            ArchivedReview(**dict(zip(REVIEW_FIELDS, row))) for row in reviews.values_list(*REVIEW_FIELDS)
+        )
+        _delete_archived(using, copied_products, copied_reviews)
+    return len(copied_products), len(copied_reviews)
+
+
+def archive_products(queryset, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Переносить усі продукти з `queryset` в архів пакетами.
+
+    Кожен пакет — окрема коротка транзакція, тому SQLite не блокується
+    на весь час архівації.
+
+    :param queryset: QuerySet продуктів для архівації.
+    :param batch_size: Кількість продуктів в одному пакеті.
+    :return: Генератор кортежів (кількість продуктів, кількість відгуків) для кожного пакета.
+    """
+    while True:
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield archive_batch(pks, queryset)
+
+
+def archived_products():
+    """ Повертає QuerySet архівних продуктів з попередньо завантаженими відгуками. """
+    return ArchivedProduct.objects.prefetch_related('reviews')
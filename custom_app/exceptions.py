@@ -0,0 +1,37 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+# Кастомні винятки API
+class PreconditionFailed(APIException):
+    """
+    Виняток API (HTTP 412): версія із заголовка `If-Match` не збігається
+    з поточною версією об'єкта.
+    """
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "Об'єкт змінено після того, як ви його отримали. Завантажте актуальну версію."
+    default_code = 'precondition_failed'
+
+
+class Conflict(APIException):
+    """
+    Виняток API (HTTP 409): паралельний запис змінив об'єкт під час
+    обробки запиту (спрацювало оптимістичне блокування).
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Об'єкт одночасно змінено іншим запитом. Повторіть спробу з актуальною версією."
+    default_code = 'conflict'
+
+
+class ProfilingUnavailable(APIException):
+    """
+    Виняток API (HTTP 501): робочий процес обробляє запити в одному потоці,
+    тож профілювати «наживо» з потоку запиту нічого.
+    """
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = (
+        'Профілювання через /api/profile/ потребує багатопотокових воркерів '
+        '(наприклад, gunicorn --threads 2+). Для однопотокових воркерів використайте '
+        '`manage.py profile_worker <pid>`.'
+    )
+    default_code = 'profiling_unavailable'
@@ -30,3 +30,43 @@ class UpperCaseCharField(models.CharField):
         if value:
             return value.upper()
         return value
+
+
+class LoadedJSONDict(dict):
+    """ Словник, прочитаний з бази; `raw` — JSON-рядок колонки на момент читання. """
+    __slots__ = ('raw',)
+
+
+class LoadedJSONList(list):
+    """ Список, прочитаний з бази; `raw` — JSON-рядок колонки на момент читання. """
+    __slots__ = ('raw',)
+
+
+_LOADED_TYPES = {dict: LoadedJSONDict, list: LoadedJSONList}
+
+
+class TrackedJSONField(models.JSONField):
+    """
+    JSONField, що зберігає поруч із розібраним значенням вихідний JSON-рядок.
+
+    Словники та списки повертаються як `LoadedJSONDict`/`LoadedJSONList`
+    з атрибутом `raw`. Це дозволяє `LoadedValuesMixin` виявляти зміни
+    "на місці" лише під час збереження (порівнянням з `json.loads(raw)`),
+    не серіалізуючи й не хешуючи значення при кожному завантаженні.
+
+    Для міграцій поле описується як звичайний `models.JSONField`.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        """ Розбирає JSON і, для словника чи списку, запам'ятовує вихідний рядок. """
+        decoded = super().from_db_value(value, expression, connection)
+        loaded_type = _LOADED_TYPES.get(type(decoded))
+        if loaded_type is None or not isinstance(value, str):
+            return decoded
+        loaded = loaded_type(decoded)
+        loaded.raw = value
+        return loaded
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        return name, 'django.db.models.JSONField', args, kwargs
@@ -116,6 +116,45 @@ class ProductForm(forms.ModelForm):
         return name
 
 
+# --- Форма адмінки з оптимістичним блокуванням ---
+class ProductAdminForm(forms.ModelForm):
+    """
+    Форма моделі Product для адмінки.
+
+    Містить приховане поле `loaded_version` з версією продукту на момент відкриття
+    форми. Якщо продукт за цей час змінили, форма не проходить валідацію,
+    а збереження виконується з перевіркою саме цієї версії.
+    """
+    loaded_version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    class Meta:
+        model = Product
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        """ Підставляє поточну версію продукту у приховане поле. """
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['loaded_version'].initial = self.instance.version
+
+    def clean(self):
+        """
+        Перевіряє, що продукт не змінено після відкриття форми.
+
+        :return: Очищені дані форми.
+        :raises forms.ValidationError: Якщо версія продукту вже інша.
+        """
+        cleaned_data = super().clean()
+        expected = cleaned_data.get('loaded_version')
+        if self.instance.pk and expected is not None:
+            if expected != self.instance.version:
+                raise forms.ValidationError(
+                    'Продукт змінено іншим користувачем. Оновіть сторінку та повторіть зміни.'
+                )
+            self.instance.expect_version(expected)
+        return cleaned_data
+
+
 # --- Форма реєстрації з кастомною валідацією ---
 class CustomUserCreationForm(UserCreationForm):
     """
@@ -0,0 +1,178 @@
+import re
+from django.contrib import admin
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from .models import CatalogueCounter, Product, ProductDailyStats, RatingHistogram, Review
+from . import stats
+
+# Типові значення параметрів, з якими будуються запити для EXPLAIN
+SAMPLE_NAME = 'SAMPLE'
+SAMPLE_PKS = [1, 2, 3]
+
+
+def _viewset_list_queryset(params):
+    """
+    Будує QuerySet, який ProductViewSet виконує для list-запиту з параметрами.
+
+    Проходить через справжні `get_queryset()` та `filter_queryset()`
+    (DjangoFilterBackend), тож відображає фактичні фільтри API.
+    """
+    from .views import ProductViewSet
+
+    view = ProductViewSet(action='list', format_kwarg=None, kwargs={})
+    view.request = Request(APIRequestFactory().get('/api/products/', params))
+    return view.filter_queryset(view.get_queryset())
+
+
+def _admin_changelist_queryset(search_term='', **filters):
+    """
+    Будує QuerySet сторінки списку продуктів в адмінці (з пошуком та фільтрами).
+
+    Використовує `ProductAdmin.get_queryset()` та `get_search_results()`,
+    стандартне сортування ChangeList (`-pk`) і LIMIT першої сторінки.
+    """
+    model_admin = admin.site._registry[Product]
+    request = APIRequestFactory().get('/admin/custom_app/product/')
+    queryset = model_admin.get_queryset(request).filter(**filters)
+    if search_term:
+        queryset, _ = model_admin.get_search_results(request, queryset, search_term)
+    queryset = queryset.order_by(*(model_admin.get_ordering(request) or ('-pk',)))
+    return queryset[:model_admin.list_per_page]
+
+
+def hot_queries():
+    """
+    Повертає запити, які код застосунку фактично виконує на гарячих шляхах.
+
+    :return: Список кортежів (назва, QuerySet).
+    """
+    from . import views
+
+    return [
+        ('api.products.list', _viewset_list_queryset({})),
+        ('api.products.filter_name', _viewset_list_queryset({'name': SAMPLE_NAME})),
+        ('api.products.filter_is_active', _viewset_list_queryset({'is_active': 'true'})),
+        ('api.products.prefetch_reviews', Review.objects.filter(product_id__in=SAMPLE_PKS)),
+        ('views.high_rated_products', views.high_rated_products.all()),
+        ('views.filtered_products', views.filtered_products.all()),
+        ('admin.changelist', _admin_changelist_queryset()),
+        ('admin.changelist.filter_is_active', _admin_changelist_queryset(is_active=False)),
+        ('admin.changelist.search', _admin_changelist_queryset(SAMPLE_NAME)),
+        ('admin.review_inline', Review.objects.with_product().filter(product_id=SAMPLE_PKS[0])),
+        ('stats.created_per_week', stats.created_per_bucket_queryset('week')),
+        ('stats.top_products', stats.top_products_queryset()),
+    ]
+
+
+
+# --- Аналіз плану запиту (SQLite EXPLAIN QUERY PLAN) ---
+# Рядок плану, який повертає QuerySet.explain() на SQLite: "<id> <parent> <notused> <detail>"
+PLAN_LINE = re.compile(r'^\d+ \d+ \d+ (.*)$')
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+TEMP_BTREE = re.compile(r'^USE TEMP B-TREE FOR (.+)$')
+
+# Невеликі rollup-таблиці, для яких повне сканування очікуване
+SMALL_TABLES = {
+    CatalogueCounter._meta.db_table,
+    ProductDailyStats._meta.db_table,
+    RatingHistogram._meta.db_table,
+}
+
+# Lookups, для яких звичайний B-tree індекс не допомагає
+UNINDEXABLE_LOOKUPS = {'contains', 'icontains', 'endswith', 'iendswith', 'regex', 'iregex'}
+
+
+def explain(queryset):
+    """
+    Повертає план виконання запиту як список рядків (без службових номерів).
+
+    :param queryset: QuerySet для аналізу.
+    :return: Список рядків плану, наприклад 'SCAN custom_app_product'.
+    """
+    lines = []
+    for line in queryset.explain().splitlines():
+        match = PLAN_LINE.match(line)
+        lines.append(match.group(1) if match else line)
+    return lines
+
+
+def filter_columns(queryset):
+    """
+    Збирає поля, за якими фільтрує запит (з умови WHERE).
+
+    :return: Словник {таблиця: [(ім'я поля, lookup), ...]}.
+    """
+    columns = {}
+
+    def walk(node):
+        for child in node.children:
+            if hasattr(child, 'children'):
+                walk(child)
+                continue
+            target = getattr(getattr(child, 'lhs', None), 'target', None)
+            if target is not None and hasattr(target, 'model'):
+                columns.setdefault(target.model._meta.db_table, []).append(
+                    (target.name, child.lookup_name)
+                )
+
+    walk(queryset.query.where)
+    return columns
+
+
+def ordering_fields(queryset):
+    """ Повертає імена полів сортування основної моделі запиту (без '-'). """
+    fields = []
+    for name in queryset.query.order_by:
+        if not isinstance(name, str):
+            continue
+        name = name.lstrip('-')
+        if name == 'pk':
+            name = queryset.model._meta.pk.name
+        if '__' not in name:
+            fields.append(name)
+    return fields
+
+
+def analyze(name, queryset):
+    """
+    Аналізує план запиту та формує рекомендації щодо індексів.
+
+    :return: Словник з назвою, SQL, планом, повними скануваннями,
+             тимчасовими B-деревами та рекомендаціями.
+    """
+    plan = explain(queryset)
+    full_scans = [m.group(1) for m in map(FULL_SCAN.match, plan) if m and m.group(1) not in SMALL_TABLES]
+    temp_btrees = [m.group(1) for m in map(TEMP_BTREE.match, plan) if m]
+    columns = filter_columns(queryset)
+
+    suggestions = []
+    for table in full_scans:
+        table_columns = columns.get(table, [])
+        indexable = sorted({field for field, lookup in table_columns if lookup not in UNINDEXABLE_LOOKUPS})
+        unindexable = sorted({f'{field}__{lookup}' for field, lookup in table_columns
+                              if lookup in UNINDEXABLE_LOOKUPS})
+        if indexable:
+            suggestions.append(f'{table}: додайте models.Index(fields={indexable!r})')
+        if unindexable:
+            suggestions.append(
+                f'{table}: фільтри {", ".join(unindexable)} не використовують B-tree індекс '
+                f'(розгляньте FTS5 або пошук за префіксом)'
+            )
+        if not table_columns and queryset.query.high_mark is None:
+            suggestions.append(f'{table}: повне сканування без фільтра — потрібна пагінація або LIMIT')
+    if any(purpose.startswith('ORDER BY') for purpose in temp_btrees):
+        fields = ordering_fields(queryset)
+        if fields:
+            suggestions.append(
+                f'{queryset.model._meta.db_table}: сортування без індексу — '
+                f'розгляньте models.Index(fields={fields!r})'
+            )
+
+    return {
+        'name': name,
+        'sql': str(queryset.query),
+        'plan': plan,
+        'full_scans': full_scans,
+        'temp_btrees': temp_btrees,
+        'suggestions': suggestions,
+    }
@@ -0,0 +1,136 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from django.http.request import RawPostDataException
+from django.http import HttpResponse, JsonResponse
+from rest_framework.response import Response
+from .sharding import current_shard
+
+# Налаштування за замовчуванням (перевизначаються словником settings.IDEMPOTENCY)
+DEFAULTS = {
+    'CACHE': 'default',
+    'TTL': 60 * 60 * 24,     # скільки зберігається відповідь, с
+    'LOCK_TIMEOUT': 30,      # скільки живе позначка "виконується", с
+}
+
+# Заголовки відповіді, які зберігаються та відтворюються
+REPLAY_HEADERS = ('Content-Type', 'Location', 'ETag')
+
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+
+
+def _config():
+    """ Повертає налаштування з урахуванням settings.IDEMPOTENCY. """
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def _cache_key(scope, request, idempotency_key):
+    """
+    Формує ключ кешу для пари (операція, користувач, Idempotency-Key).
+
+    Ключ прив'язаний до користувача та шарду каталогу, тож чужий ключ
+    (або той самий ключ в іншому тенанті) не відтворить чужу відповідь.
+    Викликається лише для автентифікованих користувачів.
+    """
+    user_id = request.user.pk
+    raw = f'{scope}|{current_shard()}|{user_id}|{idempotency_key}'.encode()
+    return 'idempotency:' + hashlib.sha256(raw).hexdigest()
+
+
+def _fingerprint(request):
+    """ Відбиток запиту (метод, шлях, тіло) для виявлення повторного використання ключа. """
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    try:
+        digest.update(request.body)
+    except RawPostDataException:
+        # multipart-тіло вже прочитано (наприклад, CSRF-перевіркою) — беремо розібрані поля
+        digest.update(repr(sorted(request.POST.lists())).encode())
+    return digest.hexdigest()
+
+
+def _snapshot(response):
+    """ Перетворює відповідь на словник, який можна зберегти в кеші. """
+    headers = {name: response[name] for name in REPLAY_HEADERS if response.has_header(name)}
+    if isinstance(response, Response):
+        return {'kind': 'drf', 'status': response.status_code, 'data': response.data, 'headers': headers}
+    return {'kind': 'http', 'status': response.status_code, 'content': response.content, 'headers': headers}
+
+
+def _replay(snapshot):
+    """ Відтворює збережену відповідь з позначкою `Idempotent-Replayed`. """
+    headers = dict(snapshot['headers'])
+    if snapshot['kind'] == 'drf':
+        headers.pop('Content-Type', None)
+        response = Response(snapshot['data'], status=snapshot['status'], headers=headers)
+    else:
+        response = HttpResponse(snapshot['content'], status=snapshot['status'], headers=headers)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent_response(request, scope, handler):
+    """
+    Виконує `handler` не більше одного разу для кожного `Idempotency-Key`.
+
+    1. Без заголовка `Idempotency-Key` або для анонімного користувача
+       (у якого немає власного простору ключів) просто викликає `handler`.
+    2. Перший запит з ключем атомарно (`cache.add`) ставить позначку
+       "виконується", викликає `handler` і зберігає відповідь на `TTL` секунд.
+       Зберігаються лише успішні відповіді (2xx/3xx): після помилки
+       валідації чи збою клієнт може виправити запит і повторити спробу
+       з тим самим ключем.
+    3. Дублікат, що прийшов під час виконання, одразу отримує 409 —
+       воркер не блокується в очікуванні першого запиту.
+    4. Той самий ключ з іншим тілом запиту повертає 422.
+
+    Обмеження розміру та термін життя сховища задає бекенд кешу
+    (`settings.CACHES[...]`, `MAX_ENTRIES`, timeout).
+
+    :param request: Об'єкт запиту (Django або DRF).
+    :param scope: Назва операції (наприклад, 'api.products.create').
+    :param handler: Функція без аргументів, що повертає відповідь.
+    :return: Відповідь (нова або відтворена).
+    """
+    idempotency_key = request.headers.get('Idempotency-Key')
+    user = getattr(request, 'user', None)
+    if not idempotency_key or user is None or not user.is_authenticated:
+        return handler()
+    if len(idempotency_key) > 255:
+        return JsonResponse({'detail': 'Заголовок Idempotency-Key задовгий (максимум 255 символів).'}, status=400)
+
+    config = _config()
+    cache = caches[config['CACHE']]
+    key = _cache_key(scope, request, idempotency_key)
+    fingerprint = _fingerprint(request)
+
+    if not cache.add(key, {'state': IN_FLIGHT, 'fingerprint': fingerprint}, config['LOCK_TIMEOUT']):
+        entry = cache.get(key)
+        if entry is not None and entry['fingerprint'] != fingerprint:
+            return JsonResponse(
+                {'detail': 'Idempotency-Key вже використано для іншого запиту.'}, status=422
+            )
+        if entry is not None and entry['state'] == DONE:
+            return _replay(entry['response'])
+        # Перший запит ще виконується (або щойно завершився помилкою)
+        return JsonResponse(
+            {'detail': 'Запит з цим Idempotency-Key ще виконується. Повторіть пізніше.'}, status=409
+        )
+
+    try:
+        response = handler()
+    except BaseException:
+        cache.delete(key)
+        raise
+
+    if response.status_code >= 400:
+        cache.delete(key)
+    else:
+        if hasattr(response, 'render') and not isinstance(response, Response):
+            response.render()
+        cache.set(
+            key,
+            {'state': DONE, 'fingerprint': fingerprint, 'response': _snapshot(response)},
+            config['TTL'],
+        )
+    return response
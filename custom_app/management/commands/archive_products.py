@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from custom_app.archive import DEFAULT_BATCH_SIZE, archivable_products, archive_products
+from custom_app.sharding import add_shard_arguments, selected_shards, use_shard
+
+
+class Command(BaseCommand):
+    """
+    Команда `manage.py archive_products`.
+
+    Переносить неактивні та/або старі продукти разом з їхніми відгуками
+    в архівні таблиці, щоб "гарячі" таблиці та їхні індекси залишалися
+    невеликими.
+    """
+    help = 'Переносить неактивні або старі продукти та їхні відгуки в архів.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-inactive', action='store_true',
+                            help='Не архівувати неактивні продукти.')
+        parser.add_argument('--older-than-days', type=int,
+                            help='Архівувати продукти, створені раніше ніж N днів тому.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Кількість продуктів в одній транзакції.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Лише показати кількість продуктів для архівації.')
+        add_shard_arguments(parser)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size має бути додатним числом.')
+        try:
+            aliases = selected_shards(options)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        for alias in aliases:
+            with use_shard(alias):
+                self._archive(alias, options)
+
+    def _archive(self, alias, options):
+        """ Архівує продукти одного шарду. """
+        queryset = archivable_products(
+            inactive=not options['skip_inactive'],
+            older_than_days=options['older_than_days'],
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f'[{alias}] Буде архівовано {queryset.count()} продуктів.')
+            return
+
+        products = reviews = 0
+        for batch_products, batch_reviews in archive_products(queryset, options['batch_size']):
+            products += batch_products
+            reviews += batch_reviews
+            self.stdout.write(f'[{alias}] Пакет: {batch_products} продуктів, {batch_reviews} відгуків.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'[{alias}] Архівовано {products} продуктів та {reviews} відгуків.'
+        ))
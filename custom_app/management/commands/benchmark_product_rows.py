@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import traceback
+import tracemalloc
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from custom_app import stats
+from custom_app.models import Product
+from custom_app.readmodels import iter_product_rows
+
+MILLION = 1_000_000
+
+
+def _load_models():
+    """ Матеріалізує усі продукти як екземпляри моделі. """
+    return list(Product.objects.order_by('pk').iterator(chunk_size=2000))
+
+
+def _load_rows():
+    """ Матеріалізує усі продукти як легкі `ProductRow`. """
+    return list(iter_product_rows())
+
+
+def _noop():
+    """ Базовий замір: нічого не завантажує. """
+    return []
+
+
+class Command(BaseCommand):
+    """
+    Команда `manage.py benchmark_product_rows`.
+
+    Порівнює пікову пам'ять при завантаженні продуктів як екземплярів моделі
+    Product та як `ProductRow` і нормалізує результат на мільйон рядків.
+
+    На POSIX кожен варіант виконується в окремому дочірньому процесі, а пікова
+    RSS береться з `os.wait4()`. На інших платформах використовується
+    `tracemalloc` (пік виділень Python-об'єктів).
+    """
+    help = 'Порівнює пам\'ять ProductRow та екземплярів моделі Product.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--populate', type=int, default=0,
+                            help='Тимчасово створити N продуктів для заміру (видаляються після).')
+
+    def handle(self, *args, **options):
+        created_ids = self._populate(options['populate'])
+        try:
+            total = Product.objects.count()
+            if not total:
+                self.stderr.write('Немає продуктів для заміру. Використайте --populate N.')
+                return
+
+            measure = self._measure_rss if hasattr(os, 'fork') else self._measure_tracemalloc
+            baseline = measure(_noop)
+            results = {
+                'Product (модель)': measure(_load_models),
+                'ProductRow': measure(_load_rows),
+            }
+
+            self.stdout.write(f'Рядків: {total}')
+            for label, (peak, elapsed) in results.items():
+                per_million = (peak - baseline[0]) * MILLION / total
+                self.stdout.write(
+                    f'{label:<18} пік: {per_million / 2 ** 20:10.1f} MiB / 1M рядків, '
+                    f'час: {elapsed:.2f} с'
+                )
+        finally:
+            self._cleanup(created_ids)
+
+    def _populate(self, count):
+        """
+        Створює `count` тестових продуктів.
+
+        `bulk_create` не надсилає сигналів, тому статистика каталогу
+        оновлюється пакетом (`stats.products_added`) у тій самій транзакції.
+
+        :return: Список первинних ключів створених продуктів.
+        """
+        if count <= 0:
+            return []
+        with transaction.atomic():
+            products = Product.objects.bulk_create(
+                (Product(name=f'BENCH {i}', details={'color': 'red', 'size': i % 10})
+                 for i in range(count)),
+                batch_size=1000,
+            )
+            stats.products_added(products)
+        return [product.pk for product in products]
+
+    def _cleanup(self, pks, batch_size=1000):
+        """
+        Видаляє тестові продукти звичайним `delete()` пакетами.
+
+        Сигнали видалення прибирають продукти зі статистики і знімка каталогу.
+        """
+        for start in range(0, len(pks), batch_size):
+            with transaction.atomic():
+                Product.objects.filter(pk__in=pks[start:start + batch_size]).delete()
+
+    def _measure_rss(self, loader):
+        """
+        Виконує `loader` у дочірньому процесі та повертає його пікову RSS.
+
+        :return: Кортеж (пікова RSS у байтах, час виконання у секундах).
+        """
+        connections.close_all()
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # Дочірній процес
+            # Дочірній процес не повинен повертатися в код команди навіть при помилці
+            status = 1
+            try:
+                os.close(read_fd)
+                start = time.perf_counter()
+                loader()
+                os.write(write_fd, str(time.perf_counter() - start).encode())
+                status = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(status)
+
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            elapsed = float(pipe.read() or 0)
+        _, status, usage = os.wait4(pid, 0)
+        if status:
+            raise CommandError(f'Замір {loader.__name__} завершився з помилкою.')
+        # ru_maxrss на Linux у KiB, на macOS — у байтах
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return usage.ru_maxrss * scale, elapsed
+
+    def _measure_tracemalloc(self, loader):
+        """
+        Виконує `loader` у поточному процесі під `tracemalloc`.
+
+        :return: Кортеж (пік виділеної пам'яті у байтах, час виконання у секундах).
+        """
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = loader()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        return peak, elapsed
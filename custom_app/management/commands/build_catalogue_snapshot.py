@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from custom_app.sharding import add_shard_arguments, selected_shards
+from custom_app.snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    """
+    Команда `manage.py build_catalogue_snapshot`.
+
+    Будує файл знімка каталогу заздалегідь (наприклад, під час деплою), щоб
+    воркери одразу відображали його у пам'ять без звернень до бази.
+    """
+    help = 'Будує спільний знімок каталогу для ProductViewSet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Шлях до файлу (лише для одного шарду).')
+        add_shard_arguments(parser)
+
+    def handle(self, *args, **options):
+        try:
+            aliases = selected_shards(options)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options['path'] and len(aliases) > 1:
+            raise CommandError('--path можна вказати лише для одного шарду.')
+        for alias in aliases:
+            count = build_snapshot(options['path'], using=alias)
+            if count is None:
+                self.stdout.write(self.style.WARNING(f'Знімок каталогу [{alias}] на диску новіший, заміну пропущено.'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Знімок каталогу [{alias}] побудовано: {count} продуктів.'))
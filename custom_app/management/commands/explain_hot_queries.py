@@ -0,0 +1,94 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from custom_app.hot_queries import analyze, hot_queries
+from custom_app.sharding import current_shard, resolve_shard, use_shard
+
+
+class Command(BaseCommand):
+    """
+    Команда `manage.py explain_hot_queries`.
+
+    Виконує EXPLAIN QUERY PLAN для запитів, які код застосунку виконує
+    на гарячих шляхах (ProductViewSet, запити з views, changelist та пошук
+    в адмінці, статистика), показує повні сканування таблиць і тимчасові
+    B-дерева та пропонує індекси.
+
+    Щоб порівняти плани до і після міграції, збережіть знімок (`--save`)
+    перед `migrate` і порівняйте після (`--compare`).
+    """
+    help = 'Аналізує плани гарячих запитів (EXPLAIN QUERY PLAN) та пропонує індекси.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sql', action='store_true', help='Показувати SQL кожного запиту.')
+        parser.add_argument('--save', help='Зберегти плани у JSON-файл (знімок для порівняння).')
+        parser.add_argument('--compare', help='Порівняти з раніше збереженим JSON-знімком.')
+        parser.add_argument('--strict', action='store_true',
+                            help='Завершитися помилкою, якщо є рекомендації або регресії плану.')
+        parser.add_argument('--shard', help='Аліас бази або ключ тенанта (за замовчуванням шард за замовчуванням).')
+
+    def handle(self, *args, **options):
+        alias = resolve_shard(options['shard'] or current_shard())
+        if alias is None:
+            raise CommandError(f'Невідомий шард або тенант: {options["shard"]}.')
+        if connections[alias].vendor != 'sqlite':
+            raise CommandError('Команда підтримує лише SQLite (EXPLAIN QUERY PLAN).')
+
+        with use_shard(alias):
+            reports = [analyze(name, queryset) for name, queryset in hot_queries()]
+        for report in reports:
+            self._print_report(report, options['sql'])
+
+        problems = sum(1 for report in reports if report['suggestions'])
+        if options['compare']:
+            problems += self._compare(reports, options['compare'])
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as stream:
+                json.dump({report['name']: report['plan'] for report in reports},
+                          stream, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Знімок планів збережено у {options["save"]}.')
+
+        self.stdout.write(f'Запитів: {len(reports)}, з проблемами: {problems}.')
+        if options['strict'] and problems:
+            raise CommandError(f'Знайдено проблем у планах запитів: {problems}.')
+
+    def _print_report(self, report, show_sql):
+        """ Виводить план та рекомендації для одного запиту. """
+        has_problems = bool(report['full_scans'] or report['temp_btrees'])
+        style = self.style.WARNING if has_problems else self.style.SUCCESS
+        self.stdout.write(style(f'== {report["name"]}'))
+        if show_sql:
+            self.stdout.write(f'   SQL: {report["sql"]}')
+        for line in report['plan']:
+            self.stdout.write(f'   {line}')
+        for suggestion in report['suggestions']:
+            self.stdout.write(self.style.NOTICE(f'   -> {suggestion}'))
+
+    def _compare(self, reports, path):
+        """
+        Порівнює поточні плани зі знімком.
+
+        :return: Кількість регресій (нові повні сканування або тимчасові B-дерева).
+        """
+        try:
+            with open(path, encoding='utf-8') as stream:
+                baseline = json.load(stream)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Не вдалося прочитати знімок {path}: {exc}')
+
+        regressions = 0
+        for report in reports:
+            old_plan = baseline.get(report['name'])
+            if old_plan is None or old_plan == report['plan']:
+                continue
+            old_problems = sum(1 for line in old_plan if line.startswith(('SCAN ', 'USE TEMP B-TREE')))
+            new_problems = sum(1 for line in report['plan'] if line.startswith(('SCAN ', 'USE TEMP B-TREE')))
+            regressed = new_problems > old_problems
+            regressions += regressed
+            style = self.style.ERROR if regressed else self.style.SUCCESS
+            self.stdout.write(style(f'План змінився: {report["name"]}' + (' (регресія)' if regressed else '')))
+            for line in old_plan:
+                self.stdout.write(f'   - {line}')
+            for line in report['plan']:
+                self.stdout.write(f'   + {line}')
+        return regressions
@@ -0,0 +1,70 @@
+import csv
+import json
+from django.core.management.base import BaseCommand, CommandError
+from custom_app.models import Product
+from custom_app.readmodels import iter_product_rows, DEFAULT_CHUNK_SIZE, ProductRow
+from custom_app.sharding import resolve_shard, current_shard
+
+
+class Command(BaseCommand):
+    """
+    Команда `manage.py export_products`.
+
+    Експортує каталог у форматі CSV або JSON Lines, використовуючи легку
+    read-модель `ProductRow` замість повних екземплярів моделі Product.
+    """
+    help = 'Експортує продукти у CSV або JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='jsonl',
+                            help='Формат експорту (за замовчуванням jsonl).')
+        parser.add_argument('--output', help='Файл для запису (за замовчуванням stdout).')
+        parser.add_argument('--active-only', action='store_true',
+                            help='Експортувати лише активні продукти.')
+        parser.add_argument('--no-details', action='store_true',
+                            help='Не читати JSON-поле details.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Кількість рядків, що читаються з бази за один раз.')
+        parser.add_argument('--shard', help='Аліас бази або ключ тенанта (за замовчуванням шард за замовчуванням).')
+
+    def handle(self, *args, **options):
+        alias = resolve_shard(options['shard'] or current_shard())
+        if alias is None:
+            raise CommandError(f'Невідомий шард або тенант: {options["shard"]}.')
+        queryset = Product.objects.using(alias)
+        if options['active_only']:
+            queryset = queryset.filter(is_active=True)
+
+        rows = iter_product_rows(
+            queryset,
+            with_details=not options['no_details'],
+            chunk_size=options['chunk_size'],
+        )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as stream:
+                count = self._write(stream, rows, options['format'])
+            self.stderr.write(f'Експортовано {count} продуктів у {options["output"]}.')
+        else:
+            self._write(self.stdout, rows, options['format'])
+
+    def _write(self, stream, rows, fmt):
+        """
+        Записує рядки у потік у вибраному форматі.
+
+        :return: Кількість записаних рядків.
+        """
+        count = 0
+        if fmt == 'csv':
+            writer = csv.writer(stream)
+            writer.writerow(ProductRow._fields)
+            for row in rows:
+                data = row.as_dict()
+                data['details'] = json.dumps(data['details'], ensure_ascii=False)
+                writer.writerow(data.values())
+                count += 1
+        else:
+            for row in rows:
+                stream.write(json.dumps(row.as_dict(), ensure_ascii=False) + '\n')
+                count += 1
+        return count
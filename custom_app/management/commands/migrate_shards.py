@@ -0,0 +1,33 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from custom_app.sharding import add_shard_arguments, selected_shards, shard_aliases
+
+
+class Command(BaseCommand):
+    """
+    Команда `manage.py migrate_shards`.
+
+    Виконує `migrate --run-syncdb` для бази за замовчуванням і кожного
+    шарду каталогу. Які таблиці створюються в якій базі, вирішує
+    `TenantRouter.allow_migrate`: таблиці каталогу — у всіх шардах,
+    користувачі, сесії та адмін-журнал — лише в `default`.
+
+    Обов'язкова після ввімкнення або збільшення CATALOGUE_SHARDS: звичайний
+    `migrate` не створює таблиць у шардах, і до того TenantMiddleware
+    відповідає на запити їхніх тенантів 404.
+    """
+    help = 'Застосовує міграції до всіх шардів каталогу.'
+
+    def add_arguments(self, parser):
+        add_shard_arguments(parser)
+
+    def handle(self, *args, **options):
+        try:
+            aliases = selected_shards(options) if options['shards'] else shard_aliases()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        for alias in aliases:
+            self.stdout.write(f'== {alias}')
+            call_command('migrate', database=alias, run_syncdb=True,
+                         interactive=False, verbosity=options['verbosity'])
+        self.stdout.write(self.style.SUCCESS(f'Шардів оновлено: {len(aliases)}.'))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from custom_app.profiling import SamplingProfiler, request_profile
+
+
+class Command(BaseCommand):
+    """
+    Команда `manage.py profile_worker`.
+
+    Знімає collapsed stacks статистичним профайлером одним із двох способів:
+
+    1. `profile_worker <pid>` — надсилає робочому процесу сигнал
+       PROFILING['SIGNAL']; процес профілює себе `--seconds` секунд
+       (обробник встановлюється у WSGI/ASGI-модулі) і повертає результат
+       через файл у PROFILING['SIGNAL_DIR'].
+    2. `profile_worker --path /api/products/ --repeat 200` — виконує запит
+       у поточному процесі через тестовий клієнт під профайлером; зручно
+       для локального аналізу гарячих шляхів без запущеного сервера.
+
+    Результат можна передати напряму у flamegraph.pl або speedscope.
+    """
+    help = 'Профілює робочий процес або запит і виводить collapsed stacks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pid', type=int, nargs='?', help='PID робочого процесу.')
+        parser.add_argument('--seconds', type=float, default=5, help='Тривалість профілювання, с.')
+        parser.add_argument('--interval', type=float, help='Період вибірки, с.')
+        parser.add_argument('--path', help='Шлях запиту для профілювання в поточному процесі.')
+        parser.add_argument('--repeat', type=int, default=100, help='Скільки разів виконати запит.')
+        parser.add_argument('--output', help='Файл для результату (за замовчуванням stdout).')
+
+    def handle(self, *args, **options):
+        if (options['pid'] is None) == (options['path'] is None):
+            raise CommandError('Вкажіть або PID робочого процесу, або --path.')
+
+        if options['pid'] is not None:
+            try:
+                collapsed = request_profile(options['pid'], options['seconds'], options['interval'])
+            except (OSError, TimeoutError) as exc:
+                raise CommandError(str(exc))
+        else:
+            client = Client(HTTP_HOST='localhost')
+            with SamplingProfiler(options['interval']) as profiler:
+                for _ in range(options['repeat']):
+                    client.get(options['path'])
+            collapsed = profiler.collapsed()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(collapsed + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Результат записано у {options["output"]}.'))
+        else:
+            self.stdout.write(collapsed)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from custom_app.readmodels import DEFAULT_CHUNK_SIZE
+from custom_app.sharding import add_shard_arguments, selected_shards, use_shard
+from custom_app.stats import rebuild_statistics
+
+
+class Command(BaseCommand):
+    """
+    Команда `manage.py rebuild_stats`.
+
+    Перераховує rollup-таблиці статистики каталогу з нуля. Потрібна після
+    масових операцій, які не надсилають сигналів (`bulk_create`,
+    `queryset.update()`), або для первинного заповнення.
+    """
+    help = 'Перераховує статистику каталогу з нуля.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Кількість рядків, що читаються з бази за один раз.')
+        add_shard_arguments(parser)
+
+    def handle(self, *args, **options):
+        try:
+            aliases = selected_shards(options)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        for alias in aliases:
+            with use_shard(alias):
+                result = rebuild_statistics(chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Статистику [{alias}] перераховано: {result["products"]} продуктів, '
+                f'{result["reviews"]} відгуків.'
+            ))
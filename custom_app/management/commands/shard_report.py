@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from custom_app.sharding import fan_out
+from custom_app import stats
+
+
+class Command(BaseCommand):
+    """
+    Команда `manage.py shard_report`.
+
+    Зведений звіт по всіх шардах каталогу: кількість активних і
+    неактивних продуктів з rollup-таблиць кожного шарду (запити до шардів
+    виконуються паралельно через `sharding.fan_out`) та підсумок.
+    """
+    help = 'Показує кількість продуктів у кожному шарді каталогу та загалом.'
+
+    def handle(self, *args, **options):
+        results = fan_out(lambda alias: stats.catalogue_counts())
+        total = {'active': 0, 'inactive': 0}
+        for alias, counts in results.items():
+            self.stdout.write(f'{alias:<20} активних: {counts["active"]:>8}  неактивних: {counts["inactive"]:>8}')
+            for key in total:
+                total[key] += counts[key]
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Разом":<20} активних: {total["active"]:>8}  неактивних: {total["inactive"]:>8}'
+        ))
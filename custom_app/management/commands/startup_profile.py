@@ -0,0 +1,88 @@
+import re
+import subprocess
+import sys
+from django.core.management.base import BaseCommand, CommandError
+
+# Рядок виводу `python -X importtime`: self | cumulative | module
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)$')
+
+# Дочірній процес друкує у stdout загальний час старту в мікросекундах
+TIMER_TEMPLATE = (
+    'import time; _start = time.perf_counter()\n'
+    '{code}\n'
+    'print(int((time.perf_counter() - _start) * 1e6))'
+)
+
+# Що саме імпортується у дочірньому процесі для кожної цілі профілювання
+TARGETS = {
+    'setup': 'import django; django.setup()',
+    'urls': 'import django; django.setup(); from django.urls import get_resolver; get_resolver().url_patterns',
+    'wsgi': 'import Homework23.wsgi',
+}
+
+
+class Command(BaseCommand):
+    """
+    Команда `manage.py startup_profile`.
+
+    Запускає окремий інтерпретатор з `-X importtime` (щоб кеш `sys.modules`
+    поточного процесу не спотворював результат) та виводить модулі з
+    найбільшим часом імпорту. З `--budget-ms` завершується помилкою, якщо
+    загальний час старту перевищує бюджет.
+
+    Примітка: `-X importtime` не показує модулі, завантажені через
+    `importlib.import_module()` (моделі, admin, URLconf), — лише їхні
+    вкладені імпорти. Тому загальний час вимірюється таймером у дочірньому
+    процесі, а не сумою рядків звіту.
+    """
+    help = 'Показує час імпорту модулів під час старту manage.py / воркера.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(TARGETS), default='setup',
+                            help='Що профілювати: django.setup(), URLconf або WSGI-застосунок.')
+        parser.add_argument('--top', type=int, default=25,
+                            help='Кількість модулів у звіті.')
+        parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative',
+                            help='Сортування за сумарним або власним часом імпорту.')
+        parser.add_argument('--prefix', default='',
+                            help='Показувати лише модулі з цим префіксом (наприклад, custom_app).')
+        parser.add_argument('--budget-ms', type=float,
+                            help='Бюджет сумарного часу імпорту в мілісекундах.')
+
+    def handle(self, *args, **options):
+        total_us, entries = self._profile(TARGETS[options['target']])
+
+        index = 0 if options['sort'] == 'self' else 1
+        selected = [entry for entry in entries if entry[2].startswith(options['prefix'])]
+        selected.sort(key=lambda entry: entry[index], reverse=True)
+
+        self.stdout.write(f'{"self, ms":>10} {"cumul., ms":>11}  модуль')
+        for self_us, cumulative_us, module in selected[:options['top']]:
+            self.stdout.write(f'{self_us / 1000:10.2f} {cumulative_us / 1000:11.2f}  {module}')
+        self.stdout.write(f'Модулів: {len(entries)}, загальний час старту: {total_us / 1000:.2f} ms')
+
+        budget = options['budget_ms']
+        if budget is not None and total_us / 1000 > budget:
+            raise CommandError(f'Час старту {total_us / 1000:.2f} ms перевищує бюджет {budget:.2f} ms.')
+
+    def _profile(self, code):
+        """
+        Виконує `code` у дочірньому інтерпретаторі з `-X importtime`.
+
+        :return: Кортеж (загальний час у мкс, список кортежів
+                 (self мкс, cumulative мкс, модуль)).
+        """
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', TIMER_TEMPLATE.format(code=code)],
+            capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'Не вдалося виконати профілювання:\n{result.stderr[-2000:]}')
+
+        entries = []
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                self_us, cumulative_us, module = match.groups()
+                entries.append((int(self_us), int(cumulative_us), module))
+        return int(result.stdout.split()[-1]), entries
@@ -1,5 +1,8 @@
+import threading
 import time
 from django.db import connection
+from django.http import HttpResponse
+from . import profiling
 
 # Зберігаємо кількість запитів у пам'яті
 REQUEST_COUNTER = 0
@@ -60,3 +63,35 @@ class CustomMetricsMiddleware:
             response['X-DB-Queries'] = str(len(connection.queries))
 
         return response
+
+
+class SamplingProfilerMiddleware:
+    """
+    Middleware для профілювання окремого запиту, обраного заголовком.
+
+    Якщо співробітник (`is_staff`) надсилає заголовок PROFILING['HEADER']
+    (за замовчуванням `X-Profile: 1`), запит виконується під статистичним
+    профайлером, що знімає стек лише потоку цього запиту, а замість
+    відповіді повертаються collapsed stacks (`text/plain`). Статус
+    початкової відповіді передається в `X-Profiled-Status`.
+
+    Має стояти після AuthenticationMiddleware. Для решти запитів лише
+    передає запит далі.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = profiling._config()
+        user = getattr(request, 'user', None)
+        if not request.headers.get(config['HEADER']) or not (user and user.is_staff):
+            return self.get_response(request)
+
+        with profiling.SamplingProfiler(
+                config['REQUEST_INTERVAL'], thread_ids={threading.get_ident()}) as profiler:
+            response = self.get_response(request)
+
+        profiled = HttpResponse(profiler.collapsed(), content_type='text/plain; charset=utf-8')
+        profiled['X-Profiled-Status'] = str(response.status_code)
+        profiled['X-Profile-Samples'] = str(profiler.samples)
+        return profiled
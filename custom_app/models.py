@@ -1,9 +1,205 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import AbstractUser
-from .fields import UpperCaseCharField
+from .fields import UpperCaseCharField, TrackedJSONField, LoadedJSONDict, LoadedJSONList
+import functools
 import json
 
 
+# --- Кешування похідних значень ---
+def derived_value(*source_fields):
+    """
+    Декоратор, який кешує результат методу моделі в межах екземпляра.
+
+    Значення зберігається у словнику `_derived_cache` екземпляра разом
+    з об'єктами полів `source_fields`, з яких його обчислено. При зверненні
+    поля порівнюються за ідентичністю (`is`): якщо полю присвоєно нове
+    значення (у т.ч. через `refresh_from_db()`), результат обчислюється
+    заново. Присвоєння атрибутів при цьому нічого не коштує.
+
+    :param source_fields: Назви полів, від яких залежить значення.
+    :return: Декоратор для методу без аргументів (крім self).
+    """
+    def decorator(method):
+        key = method.__name__
+
+        @functools.wraps(method)
+        def wrapper(self):
+            cache = self.__dict__.get('_derived_cache')
+            if cache is None:
+                cache = self.__dict__['_derived_cache'] = {}
+            sources = tuple(self.__dict__.get(name) for name in source_fields)
+            cached = cache.get(key)
+            if cached is not None and all(a is b for a, b in zip(cached[0], sources)):
+                return cached[1]
+            value = method(self)
+            cache[key] = (sources, value)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+# --- Відстеження значень, завантажених з бази ---
+class _LoadedJSON:
+    """
+    JSON-значення (словник або список) поля на момент завантаження.
+
+    Зберігається лише JSON-рядок: з бази — вихідний рядок колонки
+    (`TrackedJSONField`, без жодної роботи при завантаженні), після
+    збереження — серіалізоване значення. Рядок розбирається лише при
+    порівнянні, тобто на шляху збереження (`changed_fields()`), тож зміни
+    "на місці" (`product.details['key'] = ...`) виявляються без копіювання
+    чи хешування широкого JSON при кожному читанні.
+    """
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __eq__(self, other):
+        if isinstance(other, _LoadedJSON):
+            return self.raw == other.raw
+        return isinstance(other, (dict, list)) and json.loads(self.raw) == other
+
+    __hash__ = None
+
+
+def _snapshot(value, from_db=False):
+    """
+    Повертає значення поля для подальшого порівняння.
+
+    Словники та списки (JSONField) зберігаються як JSON-рядок (`_LoadedJSON`):
+    щойно прочитані значення `TrackedJSONField` вже містять вихідний рядок,
+    інші серіалізуються. Решта значень зберігаються як є (вони незмінні).
+
+    :param from_db: Значення щойно прочитане з бази (рядок `raw` актуальний;
+                    після зміни "на місці" і збереження він уже застарів).
+    """
+    if from_db and isinstance(value, (LoadedJSONDict, LoadedJSONList)):
+        return _LoadedJSON(value.raw)
+    if isinstance(value, (dict, list)):
+        return _LoadedJSON(json.dumps(value, default=str))
+    return value
+
+
+class LoadedValuesMixin:
+    """
+    Міксин, який запам'ятовує значення полів у момент завантаження з бази
+    (або після останнього збереження).
+
+    Дозволяє обробникам сигналів та методу `save()` дізнатися попереднє
+    значення поля без додаткового запиту до бази. `save()` існуючого
+    об'єкта без явного `update_fields` записує лише змінені колонки.
+    """
+    # Поля, які база/модель змінює при кожному збереженні (наприклад, версія)
+    ALWAYS_SAVED_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """ Створює екземпляр і зберігає завантажені значення полів. """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: _snapshot(value, from_db=True) for name, value in zip(field_names, values)
+        }
+        return instance
+
+    def loaded_value(self, attname, default=None):
+        """
+        Повертає значення поля на момент завантаження/останнього збереження.
+
+        Для JSON-значень (словників і списків) зберігається лише JSON-рядок,
+        тому для них повертається `default`.
+
+        :param attname: Ім'я атрибута поля (наприклад, 'is_active' або 'product_id').
+        :param default: Значення, якщо екземпляр ще не зберігався або поле
+                        не завантажувалося.
+        """
+        value = self.__dict__.get('_loaded_values', {}).get(attname, default)
+        return default if isinstance(value, _LoadedJSON) else value
+
+    def changed_fields(self):
+        """
+        Повертає імена полів, значення яких змінилися з моменту завантаження.
+
+        Поля, які були відкладені (`defer()`/`only()`) і потім присвоєні,
+        вважаються зміненими; поля з `auto_now` включаються завжди.
+
+        :return: Список імен полів або None, якщо об'єкт не завантажувався
+                 з бази (тоді змінені поля невідомі).
+        """
+        loaded = self.__dict__.get('_loaded_values')
+        if loaded is None:
+            return None
+        deferred = self.get_deferred_fields()
+        changed = []
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname in deferred:
+                continue
+            if getattr(field, 'auto_now', False):
+                changed.append(field.name)
+            elif field.attname not in loaded or loaded[field.attname] != getattr(self, field.attname):
+                changed.append(field.name)
+        return changed
+
+    def save(self, *args, update_fields=None, **kwargs):
+        """
+        Зберігає об'єкт та оновлює запам'ятовані значення полів.
+
+        Для вже існуючого об'єкта без явного `update_fields` оновлюються
+        лише змінені поля: паралельні записи в інші поля не перезаписуються,
+        а незмінений широкий JSON не передається в базу. Якщо нічого не
+        змінилося, запит до бази (і сигнали) пропускаються.
+        """
+        if (update_fields is None and not args and not self._state.adding
+                and not kwargs.get('force_insert')):
+            update_fields = self.changed_fields()
+        super().save(*args, update_fields=update_fields, **kwargs)
+        # Незбережені зміни інших полів мають залишитися "зміненими"
+        if update_fields is not None:
+            update_fields = [*update_fields, *self.ALWAYS_SAVED_FIELDS]
+        self._remember_loaded_values(update_fields)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        """
+        Перезавантажує поля з бази та оновлює запам'ятовані значення лише
+        для перезавантажених полів.
+
+        Django викликає часткове перезавантаження й неявно — при читанні
+        відкладеного поля; незбережені зміни інших полів при цьому не
+        повинні вважатися завантаженими, інакше `save()` їх пропустить.
+        """
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_loaded_values(fields)
+
+    def _remember_loaded_values(self, fields=None):
+        """
+        Запам'ятовує поточні значення завантажених полів.
+
+        :param fields: Імена (або attname) полів, значення яких щойно
+                       прочитано з бази чи записано в неї; None — усі
+                       невідкладені поля.
+        """
+        deferred = self.get_deferred_fields()
+        selected = None if fields is None else set(fields)
+        loaded = self.__dict__.get('_loaded_values') if selected is not None else None
+        loaded = dict(loaded or {})
+        for field in self._meta.concrete_fields:
+            if field.attname in deferred:
+                continue
+            if selected is not None and field.name not in selected and field.attname not in selected:
+                continue
+            loaded[field.attname] = _snapshot(getattr(self, field.attname))
+        self._loaded_values = loaded
+
+
+class ConcurrentUpdateError(Exception):
+    """
+    Виняток: об'єкт змінено іншим записом після його завантаження
+    (не збігається номер версії при оптимістичному блокуванні).
+    """
+
+
 # Кастомна модель користувача
 class CustomUser(AbstractUser):
     """
@@ -42,7 +238,41 @@ class CustomUser(AbstractUser):
         return self.username
 
 
-class Product(models.Model):
+class JSONExtractKeys(models.Func):
+    """
+    Витягує значення кількох ключів JSON-поля в базі даних одним викликом
+    `JSON_EXTRACT(поле, '$."a"', '$."b"', ...)` (SQLite).
+
+    При двох і більше шляхах SQLite повертає JSON-масив значень зі
+    збереженням типів (true/false/null/об'єкти), тому для одного ключа
+    шлях дублюється. Результат — список значень у порядку ключів.
+    """
+    function = 'JSON_EXTRACT'
+    output_field = models.JSONField()
+
+    def __init__(self, expression, keys, **extra):
+        paths = [models.Value(f'$."{key}"') for key in keys]
+        if len(paths) == 1:
+            paths *= 2
+        super().__init__(expression, *paths, **extra)
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    QuerySet для моделі Product.
+    """
+
+    def with_details_keys(self, keys):
+        """
+        Не завантажує повне JSON-поле `details`, а витягує лише вказані
+        ключі в базі даних (анотація `details_values`, список значень).
+
+        :param keys: Послідовність ключів верхнього рівня поля `details`.
+        """
+        return self.defer('details').annotate(details_values=JSONExtractKeys('details', keys))
+
+
+class Product(LoadedValuesMixin, models.Model):
     """
     Модель, що представляє продукт.
 
@@ -52,13 +282,69 @@ class Product(models.Model):
     # Кастомне поле для зберігання у верхньому регістрі
     name = UpperCaseCharField(max_length=100)
 
-    # Зберігання даних у форматі JSON
-    details = models.JSONField(default=dict)
+    # Зберігання даних у форматі JSON (з вихідним рядком для відстеження змін)
+    details = TrackedJSONField(default=dict)
 
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Номер версії для оптимістичного блокування (збільшується при кожному UPDATE)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    ALWAYS_SAVED_FIELDS = ('version',)
+
+    def expect_version(self, version):
+        """
+        Задає версію, яку наступне збереження очікує побачити в базі.
+
+        За замовчуванням очікується версія, завантажена з бази. Явна версія
+        потрібна, коли клієнт редагував об'єкт раніше (заголовок `If-Match`
+        в API або приховане поле форми в адмінці).
+
+        :param version: Очікуваний номер версії (int).
+        """
+        self._expected_version = version
+
+    def save(self, *args, **kwargs):
+        """
+        Зберігає продукт з перевіркою версії (оптимістичне блокування).
+
+        Перед UPDATE версія "захоплюється" умовним запитом
+        `filter(pk=..., version=<очікувана>).update(version=<очікувана> + 1)`;
+        якщо рядок існує, але версія не збіглася, викидається
+        `ConcurrentUpdateError` замість мовчазного перезапису чужих змін.
+        Збереження без змінених полів не змінює версію і не звертається до бази.
+
+        :raises ConcurrentUpdateError: Якщо об'єкт змінено іншим записом.
+        """
+        expected = self.__dict__.pop('_expected_version', None)
+        if expected is None:
+            expected = self.loaded_value('version')
+        if self._state.adding or expected is None or args or kwargs.get('force_insert'):
+            return super().save(*args, **kwargs)
+        if kwargs.get('update_fields') is None:
+            # Змінені поля обчислюються один раз (LoadedValuesMixin.save їх не перераховує)
+            kwargs['update_fields'] = self.changed_fields()
+        if not kwargs['update_fields']:
+            return super().save(*args, **kwargs)
+
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        rows = type(self)._base_manager.using(using).filter(pk=self.pk)
+        with transaction.atomic(using=using, savepoint=False):
+            if rows.filter(version=expected).update(version=expected + 1):
+                self.version = expected + 1
+                return super().save(*args, **kwargs)
+        if rows.exists():
+            raise ConcurrentUpdateError(
+                f"Продукт (ID: {self.pk}) змінено іншим користувачем (очікувана версія {expected})."
+            )
+        # Рядок видалено: звичайне збереження (INSERT, як для нового об'єкта)
+        return super().save(*args, **kwargs)
+
     # Метод обробки даних(підрахунок статистики)
+    @derived_value('name')
     def get_name_length(self):
         """
         Повертає довжину назви продукту.
@@ -68,14 +354,18 @@ class Product(models.Model):
         """
         return len(self.name)
 
-    def count_details_keys(self):
+    @derived_value('details')
+    def _decoded_details(self):
         """
-        Підраховує кількість ключів/елементів у JSON полі 'details'.
+        Повертає вміст поля 'details' як Python-об'єкт.
 
         Обробляє випадки, коли поле може зберігатися як рядок JSON (наприклад,
         за певних умов або під час міграції) і намагається його десеріалізувати.
+        Результат кешується, тож рядок розбирається лише один раз на екземпляр.
+        Словник/список повертається як є, тому зміни "на місці" не роблять
+        кеш застарілим.
 
-        :return: Кількість ключів у словнику або елементів у списку (int).
+        :return: Десеріалізовані дані або None, якщо розбір не вдався.
         """
         details_data = self.details
 
@@ -83,10 +373,19 @@ class Product(models.Model):
         if isinstance(details_data, str):
             try:
                 # Намагаємося перетворити JSON-рядок на Python-об'єкт
-                details_data = json.loads(details_data)
+                return json.loads(details_data)
             except (json.JSONDecodeError, TypeError):
                 # Якщо десеріалізація не вдалася або це пустий рядок/None
-                return 0
+                return None
+        return details_data
+
+    def count_details_keys(self):
+        """
+        Підраховує кількість ключів/елементів у JSON полі 'details'.
+
+        :return: Кількість ключів у словнику або елементів у списку (int).
+        """
+        details_data = self._decoded_details()
 
         # Якщо це словник/список, повертаємо його довжину
         if isinstance(details_data, dict):
@@ -99,19 +398,152 @@ class Product(models.Model):
     # Додавання атрибутів для відображення в Django Admin
     count_details_keys.short_description = 'К-ть деталей'
 
+    class Meta:
+        # Часткові індекси лише для активних продуктів: саме їх фільтрує
+        # ProductViewSet, тому неактивні рядки не роздувають індекси.
+        indexes = [
+            models.Index(fields=['name'], condition=models.Q(is_active=True),
+                         name='product_active_name_idx'),
+            models.Index(fields=['created_at'], condition=models.Q(is_active=True),
+                         name='product_active_created_idx'),
+        ]
+
     def __str__(self):
         """ Повертає рядок, що представляє об'єкт (назва продукту). """
         return self.name
 
 
-class Review(models.Model):
+class ReviewQuerySet(models.QuerySet):
+    """
+    QuerySet для моделі Review.
+    """
+
+    def with_product(self):
+        """
+        Завантажує пов'язаний продукт одним JOIN-запитом.
+
+        Використовується у списках відгуків (адмінка, API), щоб `__str__`
+        не виконував окремий запит для кожного рядка.
+        """
+        return self.select_related('product')
+
+
+class Review(LoadedValuesMixin, models.Model):
     """
     Модель для зберігання відгуків та рейтингів до продуктів.
     """
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='review')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     text = models.TextField()
     rating = models.IntegerField(default=5)
 
+    objects = ReviewQuerySet.as_manager()
+
     def __str__(self):
         """ Повертає рядок, що представляє об'єкт (рейтинг і назва продукту). """
         return f"Рейтинг продукту {self.product.name} ({self.rating}/5)"
+
+
+# --- Архівні таблиці ---
+class ArchivedProduct(models.Model):
+    """
+    Архівна копія продукту, перенесеного з "гарячої" таблиці.
+
+    Зберігає той самий первинний ключ, що й оригінальний продукт, тому
+    посилання на архівні продукти залишаються дійсними.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=100)
+    details = models.JSONField(default=dict)
+    is_active = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    version = models.PositiveIntegerField(default=1)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """ Повертає рядок, що представляє об'єкт (назва продукту). """
+        return self.name
+
+
+class ArchivedReview(models.Model):
+    """
+    Архівна копія відгуку, перенесеного разом зі своїм продуктом.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(ArchivedProduct, on_delete=models.CASCADE, related_name='reviews')
+    text = models.TextField()
+    rating = models.IntegerField(default=5)
+
+    def __str__(self):
+        """ Повертає рядок, що представляє об'єкт (рейтинг і id продукту). """
+        return f"Архівний відгук до продукту {self.product_id} ({self.rating}/5)"
+
+
+# --- Таблиці зведеної статистики (rollups) ---
+class CatalogueCounter(models.Model):
+    """
+    Іменований лічильник каталогу (наприклад, кількість активних продуктів).
+
+    Оновлюється інкрементально з сигналів (див. `custom_app.stats`).
+    """
+    ACTIVE_PRODUCTS = 'active_products'
+    INACTIVE_PRODUCTS = 'inactive_products'
+    # Покоління каталогу для знімка (див. `custom_app.snapshot`)
+    SNAPSHOT_GENERATION = 'snapshot_generation'
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        """ Повертає рядок, що представляє лічильник (назва та значення). """
+        return f"{self.name}={self.value}"
+
+
+class ProductDailyStats(models.Model):
+    """
+    Кількість продуктів, створених за день (за полем `created_at`).
+    """
+    day = models.DateField(unique=True)
+    created_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        """ Повертає рядок, що представляє день та кількість продуктів. """
+        return f"{self.day}: {self.created_count}"
+
+
+class RatingHistogram(models.Model):
+    """
+    Кількість відгуків з кожним значенням рейтингу.
+    """
+    rating = models.IntegerField(unique=True)
+    review_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        """ Повертає рядок, що представляє рейтинг та кількість відгуків. """
+        return f"{self.rating}: {self.review_count}"
+
+
+class ProductReviewStats(models.Model):
+    """
+    Кількість відгуків та сума рейтингів для кожного продукту.
+
+    Використовується для побудови рейтингу продуктів за кількістю відгуків.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='review_stats'
+    )
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['-review_count'], name='review_stats_count_idx')]
+
+    @property
+    def average_rating(self):
+        """ Середній рейтинг продукту або None, якщо відгуків немає. """
+        if not self.review_count:
+            return None
+        return self.rating_sum / self.review_count
+
+    def __str__(self):
+        """ Повертає рядок, що представляє продукт та кількість відгуків. """
+        return f"{self.product_id}: {self.review_count}"
@@ -0,0 +1,245 @@
+import json
+import os
+import signal
+import stat
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+
+# Налаштування за замовчуванням (перевизначаються словником settings.PROFILING)
+DEFAULTS = {
+    'INTERVAL': 0.005,          # період вибірки, с
+    'REQUEST_INTERVAL': 0.001,  # період вибірки при профілюванні одного запиту, с
+    'MAX_SECONDS': 60,          # найдовший дозволений сеанс профілювання, с
+    'HEADER': 'X-Profile',      # заголовок, що вмикає профілювання запиту
+    'SIGNAL': 'SIGURG',         # сигнал для `manage.py profile_worker` (типово ігнорується)
+    'SIGNAL_DIR': None,         # приватна (0700) директорія для обміну файлами з profile_worker
+}
+
+
+def _config():
+    """ Повертає налаштування з урахуванням settings.PROFILING. """
+    return {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+def _frame_label(frame):
+    """ Підпис кадру у вигляді `модуль:функція`. """
+    code = frame.f_code
+    return f'{frame.f_globals.get("__name__", "?")}:{code.co_qualname}'
+
+
+def collapse_stack(frame):
+    """ Стек кадру у форматі collapsed stacks: від кореня до листа через `;`. """
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class SamplingProfiler:
+    """
+    Статистичний профайлер: фоновий потік періодично знімає стеки потоків.
+
+    На відміну від cProfile не перехоплює кожен виклик функції, тож
+    накладні витрати залежать лише від періоду вибірки, і його можна
+    запускати в робочому процесі під навантаженням.
+
+    Використання::
+
+        with SamplingProfiler(interval=0.005) as profiler:
+            ...
+        print(profiler.collapsed())
+
+    :param interval: Період вибірки в секундах.
+    :param thread_ids: Які потоки профілювати (None — усі, крім `exclude`).
+    :param exclude: Потоки, які треба пропустити (наприклад, потік запиту,
+                    що чекає на завершення профілювання).
+    """
+
+    def __init__(self, interval=None, thread_ids=None, exclude=()):
+        self.interval = interval or _config()['INTERVAL']
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.exclude = set(exclude)
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or ident in self.exclude:
+                    continue
+                if self.thread_ids is not None and ident not in self.thread_ids:
+                    continue
+                self.stacks[collapse_stack(frame)] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """
+        Результат у форматі collapsed stacks (`стек кількість` на рядок).
+
+        Його напряму приймають `flamegraph.pl`, speedscope та inferno.
+        """
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common())
+
+    def as_dict(self):
+        """ Результат для JSON-відповіді. """
+        return {
+            'interval': self.interval,
+            'samples': self.samples,
+            'stacks': dict(self.stacks.most_common()),
+        }
+
+
+def profile_for(seconds, interval=None, exclude=()):
+    """
+    Профілює всі потоки процесу протягом `seconds` секунд.
+
+    :return: Зупинений `SamplingProfiler` з результатами.
+    :raises ValueError: Якщо тривалість перевищує PROFILING['MAX_SECONDS'].
+    """
+    if not 0 < seconds <= _config()['MAX_SECONDS']:
+        raise ValueError(f'Тривалість має бути в межах (0, {_config()["MAX_SECONDS"]}] с.')
+    with SamplingProfiler(interval, exclude=exclude) as profiler:
+        time.sleep(seconds)
+    return profiler
+
+
+# --- Профілювання іншого процесу через сигнал ---
+def signal_dir():
+    """
+    Повертає приватну директорію для файлів-запитів і результатів.
+
+    За замовчуванням — `custom_app-profile-<uid>` у тимчасовій директорії.
+    Директорія створюється з правами 0700; якщо вона вже існує, але є
+    посиланням, належить іншому користувачу або доступна іншим, —
+    використовувати її небезпечно (підміна файлів через symlink).
+
+    :raises PermissionError: Якщо директорія не приватна.
+    """
+    path = _config()['SIGNAL_DIR'] or os.path.join(tempfile.gettempdir(), f'custom_app-profile-{os.getuid()}')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f'Директорія {path} має належати поточному користувачу і мати права 0700.')
+    return path
+
+
+def signal_paths(pid):
+    """ Шляхи до файлу-запиту та файлу результату для процесу `pid`. """
+    base = os.path.join(signal_dir(), f'profile-{pid}')
+    return f'{base}.json', f'{base}.collapsed'
+
+
+def _write_atomic(path, content):
+    """ Записує файл через тимчасовий файл (`mkstemp`) у тій самій директорії. """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.profile-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _serve_signal_request():
+    """
+    Виконує запит `profile_worker`: читає і перевіряє параметри з файлу-запиту,
+    профілює процес і записує collapsed stacks у файл результату.
+
+    Працює у фоновому потоці; некоректний запит ігнорується.
+    """
+    try:
+        request_path, output_path = signal_paths(os.getpid())
+        with open(request_path, encoding='utf-8') as stream:
+            options = json.load(stream)
+        os.remove(request_path)
+        seconds = float(options['seconds'])
+        interval = options.get('interval')
+        interval = float(interval) if interval is not None else None
+        if interval is not None and not 0 < interval <= 1:
+            raise ValueError(interval)
+        profiler = profile_for(seconds, interval)
+        _write_atomic(output_path, profiler.collapsed() + '\n')
+    except (OSError, ValueError, TypeError, KeyError):
+        return
+
+
+def _handle_signal(signum, frame):
+    """
+    Обробник сигналу: лише запускає фоновий потік `_serve_signal_request`,
+    тож обробка запитів у головному потоці не блокується.
+    """
+    threading.Thread(target=_serve_signal_request, name='sampling-profiler-signal', daemon=True).start()
+
+
+def install_signal_handler():
+    """
+    Реєструє обробник сигналу PROFILING['SIGNAL'] у поточному процесі.
+
+    Викликається з WSGI/ASGI-модуля. Типовий SIGURG за замовчуванням
+    ігнорується і не використовується gunicorn, тож сигнал процесу без
+    обробника нічого не зламає, а обробник, встановлений до fork,
+    успадковується воркерами.
+
+    :return: True, якщо обробник встановлено.
+    """
+    signum = getattr(signal, _config()['SIGNAL'], None)
+    if signum is None:
+        return False
+    try:
+        signal.signal(signum, _handle_signal)
+    except ValueError:
+        # signal.signal() можна викликати лише з головного потоку
+        return False
+    return True
+
+
+def request_profile(pid, seconds, interval=None, timeout=10):
+    """
+    Просить процес `pid` профілювати себе і повертає collapsed stacks.
+
+    :raises TimeoutError: Якщо процес не записав результат вчасно
+                          (наприклад, обробник сигналу не встановлено).
+    """
+    request_path, output_path = signal_paths(pid)
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    _write_atomic(request_path, json.dumps({'seconds': seconds, 'interval': interval}))
+    os.kill(pid, getattr(signal, _config()['SIGNAL']))
+
+    deadline = time.monotonic() + seconds + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(output_path):
+            with open(output_path, encoding='utf-8') as stream:
+                result = stream.read()
+            os.remove(output_path)
+            return result
+        time.sleep(0.1)
+    if os.path.exists(request_path):
+        os.remove(request_path)
+    raise TimeoutError(f'Процес {pid} не повернув результат профілювання.')
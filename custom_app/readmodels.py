@@ -0,0 +1,63 @@
+from typing import NamedTuple, Any
+from datetime import datetime
+from .models import Product
+
+
+# Розмір пакета рядків, які читаються з курсора за один раз
+DEFAULT_CHUNK_SIZE = 2000
+
+
+# --- Легка read-модель для масового читання ---
+class ProductRow(NamedTuple):
+    """
+    Легке представлення продукту лише для читання.
+
+    На відміну від екземпляра моделі Product, не має власного `__dict__`
+    та `_state`: це звичайний кортеж з іменованими полями, який будується
+    безпосередньо з `.values_list()`. Використовується в масових шляхах
+    читання (експорт, перерахунок агрегатів, побудова знімка каталогу).
+    """
+    id: int
+    name: str
+    details: Any
+    is_active: bool
+    created_at: datetime
+    version: int
+
+    def as_dict(self):
+        """
+        Повертає рядок як словник, придатний для JSON-серіалізації.
+
+        :return: Словник з полями продукту (дата у форматі ISO 8601).
+        """
+        data = self._asdict()
+        data['created_at'] = self.created_at.isoformat() if self.created_at else None
+        return data
+
+
+def iter_product_rows(queryset=None, *, with_details=True, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Ітерує продукти як `ProductRow`, читаючи курсор пакетами.
+
+    Дані не кешуються у QuerySet, тому пам'ять не зростає разом із
+    кількістю рядків.
+
+    :param queryset: QuerySet продуктів (за замовчуванням усі продукти).
+    :param with_details: Якщо False, JSON-поле `details` не читається
+                         і не декодується (у рядку буде None).
+    :param chunk_size: Кількість рядків, що читаються з бази за один раз.
+    :return: Генератор об'єктів `ProductRow`.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    queryset = queryset.order_by('pk')
+
+    if with_details:
+        rows = queryset.values_list(*ProductRow._fields)
+        make = ProductRow._make
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield make(row)
+    else:
+        rows = queryset.values_list('id', 'name', 'is_active', 'created_at', 'version')
+        for pk, name, is_active, created_at, version in rows.iterator(chunk_size=chunk_size):
+            yield ProductRow(pk, name, None, is_active, created_at, version)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Product, Review
+from .models import Product, Review, ArchivedProduct, ArchivedReview
+from .tracing import span
 
 
 # Вкладений серіалізатор
@@ -15,6 +16,33 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ('id', 'text', 'rating')
 
 
+class DetailsSubsetField(serializers.Field):
+    """
+    Поле лише для читання: підмножина ключів JSON-поля `details`.
+
+    Значення беруться з анотації `details_values`, яку додає
+    `ProductQuerySet.with_details_keys()`, тож повний JSON не декодується.
+    """
+
+    def __init__(self, keys, **kwargs):
+        self.keys = list(keys)
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        values = getattr(instance, 'details_values', None) or [None] * len(self.keys)
+        return dict(zip(self.keys, values))
+
+
+class TracedListSerializer(serializers.ListSerializer):
+    """ ListSerializer, серіалізація якого записується у спан `serialize`. """
+
+    @property
+    def data(self):
+        with span('serialize', **{'serializer': type(self.child).__name__, 'serializer.many': True}):
+            return super().data
+
+
 class ProductSerializer(serializers.ModelSerializer):
     """
     Серіалізатор для моделі Product.
@@ -23,11 +51,57 @@ class ProductSerializer(serializers.ModelSerializer):
     придатні для API (JSON/XML), і навпаки.
 
     Включає вкладене поле `reviews` для відображення всіх відгуків,
-    пов'язаних із продуктом.
+    пов'язаних із продуктом, та номер версії `version` (лише читання)
+    для оптимістичного блокування.
     """
     # Вкладене поле (Related field)
     reviews = ReviewSerializer(many=True, read_only=True)
 
     class Meta:
         model = Product
-        fields = ('id', 'name', 'details', 'is_active', 'reviews')
+        fields = ('id', 'name', 'details', 'is_active', 'version', 'reviews')
+        read_only_fields = ('version',)
+        list_serializer_class = TracedListSerializer
+
+    def __init__(self, *args, fields=None, details_keys=None, **kwargs):
+        """
+        Дозволяє обмежити набір полів (sparse fieldsets).
+
+        :param fields: Імена полів, які потрібно залишити (None — усі).
+        :param details_keys: Якщо задано, поле `details` містить лише ці ключі
+                             (див. `DetailsSubsetField`).
+        """
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if details_keys and 'details' in self.fields:
+            self.fields['details'] = DetailsSubsetField(details_keys)
+
+    @property
+    def data(self):
+        with span('serialize', serializer=type(self).__name__):
+            return super().data
+
+
+class ArchivedReviewSerializer(serializers.ModelSerializer):
+    """
+    Серіалізатор для моделі ArchivedReview (лише читання).
+    """
+    class Meta:
+        model = ArchivedReview
+        fields = ('id', 'text', 'rating')
+
+
+class ArchivedProductSerializer(serializers.ModelSerializer):
+    """
+    Серіалізатор для моделі ArchivedProduct (лише читання).
+
+    Має ту саму структуру, що й ProductSerializer, плюс дату архівації.
+    """
+    reviews = ArchivedReviewSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedProduct
+        fields = ('id', 'name', 'details', 'is_active', 'version', 'archived_at', 'reviews')
+        read_only_fields = fields
@@ -0,0 +1,272 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponseRedirect, JsonResponse
+from django.urls import NoReverseMatch, reverse
+
+# Налаштування за замовчуванням (перевизначаються словником settings.SHARDING)
+DEFAULTS = {
+    'HEADER': 'X-Tenant',          # заголовок із ключем тенанта
+    'QUERY_PARAM': 'tenant',       # параметр для вибору тенанта в сесії (адмінка)
+    'SESSION_KEY': 'tenant',
+    'DEFAULT_SHARD': DEFAULT_DB_ALIAS,
+    'TENANTS': {},                 # ключ тенанта -> аліас бази даних
+    # Група, членство в якій дає доступ до тенанта (персонал має доступ до всіх)
+    'TENANT_GROUP': 'tenant:{tenant}',
+}
+
+# Моделі custom_app, що зберігаються в базі користувачів, а не в шардах
+UNSHARDED_MODELS = {'customuser'}
+SHARDED_APP = 'custom_app'
+
+_current_shard = ContextVar('custom_app_current_shard', default=None)
+# Шарди, в яких уже перевірено наявність таблиць каталогу
+_migrated_shards = set()
+
+
+def _config():
+    """ Повертає налаштування з урахуванням settings.SHARDING. """
+    return {**DEFAULTS, **getattr(settings, 'SHARDING', {})}
+
+
+def is_sharded(app_label, model_name):
+    """ Чи зберігається модель у шардах каталогу. """
+    return app_label == SHARDED_APP and model_name not in UNSHARDED_MODELS
+
+
+def shard_aliases():
+    """ Усі аліаси баз, що містять каталоги (шард за замовчуванням — перший). """
+    config = _config()
+    return list(dict.fromkeys([config['DEFAULT_SHARD'], *config['TENANTS'].values()]))
+
+
+def shard_for_tenant(tenant):
+    """
+    Повертає аліас бази для тенанта.
+
+    :return: Аліас або None, якщо тенант невідомий.
+    """
+    return _config()['TENANTS'].get(tenant)
+
+
+def resolve_shard(name):
+    """ Приймає аліас шарду або ключ тенанта і повертає аліас (None — невідомо). """
+    return name if name in shard_aliases() else shard_for_tenant(name)
+
+
+def tenant_allowed(user, tenant):
+    """
+    Чи може користувач працювати з каталогом тенанта.
+
+    Доступ мають персонал (`is_staff`) та члени групи SHARDING['TENANT_GROUP']
+    (за замовчуванням `tenant:<ключ>`); анонімні користувачі — ні.
+    """
+    if not user.is_authenticated:
+        return False
+    if user.is_staff:
+        return True
+    return user.groups.filter(name=_config()['TENANT_GROUP'].format(tenant=tenant)).exists()
+
+
+def is_migrated(alias):
+    """
+    Чи створено в шарді таблиці каталогу (`manage.py migrate_shards`).
+
+    Позитивний результат кешується на процес; відсутні таблиці
+    перевіряються знову, тож після міграції перезапуск не потрібен.
+    """
+    if alias in _migrated_shards:
+        return True
+    from django.apps import apps
+
+    table = apps.get_model(SHARDED_APP, 'Product')._meta.db_table
+    if table not in connections[alias].introspection.table_names():
+        return False
+    _migrated_shards.add(alias)
+    return True
+
+
+def current_shard():
+    """ Аліас шарду поточного запиту/контексту. """
+    return _current_shard.get() or _config()['DEFAULT_SHARD']
+
+
+@contextmanager
+def use_shard(alias):
+    """ Направляє всі запити до моделей каталогу в межах блоку на шард `alias`. """
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+def fan_out(function, shards=None, max_workers=None):
+    """
+    Виконує `function(alias)` на кожному шарді й повертає словник результатів.
+
+    Шарди — окремі файли SQLite, тож запити виконуються паралельно в
+    пулі потоків (кожен потік має власні з'єднання і закриває їх). Якщо
+    будь-який шард зараз у транзакції, виклики виконуються послідовно
+    в поточному потоці, щоб бачити незакомічені зміни.
+
+    :param function: Функція від аліасу шарду (всередині вже діє `use_shard`).
+    :param shards: Аліаси шардів (за замовчуванням усі).
+    :param max_workers: Розмір пулу потоків (1 — послідовно).
+    :return: Словник {аліас: результат} у порядку `shards`.
+    """
+    aliases = list(shards or shard_aliases())
+
+    def run(alias):
+        with use_shard(alias):
+            return function(alias)
+
+    def run_in_thread(alias):
+        try:
+            return run(alias)
+        finally:
+            connections.close_all()
+
+    in_transaction = any(connections[alias].in_atomic_block for alias in aliases)
+    if in_transaction or max_workers == 1 or len(aliases) < 2:
+        return {alias: run(alias) for alias in aliases}
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(aliases)) as executor:
+        return dict(zip(aliases, executor.map(run_in_thread, aliases)))
+
+
+class TenantRouter:
+    """
+    Роутер баз даних: моделі каталогу — у шард тенанта, решта — у `default`.
+
+    Шард визначається контекстом (`use_shard`, `TenantMiddleware`), а для
+    вже завантажених об'єктів — базою, з якої їх прочитано. Зв'язки між
+    об'єктами каталогу дозволені лише в межах одного шарду.
+    """
+
+    def _db_for_model(self, model, **hints):
+        if not is_sharded(model._meta.app_label, model._meta.model_name):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return current_shard()
+
+    db_for_read = _db_for_model
+    db_for_write = _db_for_model
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_sharded(obj1._meta.app_label, obj1._meta.model_name) and \
+                is_sharded(obj2._meta.app_label, obj2._meta.model_name):
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if model_name is not None and is_sharded(app_label, model_name):
+            return db in shard_aliases()
+        if model_name is None and app_label == SHARDED_APP:
+            return None
+        return db == DEFAULT_DB_ALIAS
+
+
+class TenantMiddleware:
+    """
+    Middleware, що визначає тенанта запиту і вмикає його шард.
+
+    Ключ тенанта береться із заголовка SHARDING['HEADER'], а якщо його
+    немає — із сесії. У сесію його записує параметр `?tenant=` на сторінках
+    адмінки (порожнє значення — скидає), після чого запит перенаправляється
+    на ту саму адресу без параметра. Поза адмінкою параметр ігнорується.
+    Без тенанта використовується шард за замовчуванням. Невідомий тенант
+    або шард без таблиць (не виконано `migrate_shards`) — 404, тенант без
+    доступу (`tenant_allowed`) — 403; у сесію такі тенанти не записуються.
+
+    Має стояти після AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = _config()
+        session = getattr(request, 'session', None)
+        tenant = request.headers.get(config['HEADER'])
+        selected = request.GET.get(config['QUERY_PARAM'])
+        if selected is not None and session is not None and request.method == 'GET' \
+                and self._is_admin_path(request.path):
+            if selected:
+                _, error = self._resolve(request, selected)
+                if error is not None:
+                    return error
+                session[config['SESSION_KEY']] = selected
+            else:
+                session.pop(config['SESSION_KEY'], None)
+            query = request.GET.copy()
+            del query[config['QUERY_PARAM']]
+            return HttpResponseRedirect(f'{request.path}?{query.urlencode()}' if query else request.path)
+        if not tenant and session is not None:
+            tenant = session.get(config['SESSION_KEY'])
+
+        alias = config['DEFAULT_SHARD']
+        if tenant:
+            alias, error = self._resolve(request, tenant)
+            if error is not None:
+                return error
+        request.tenant = tenant
+        request.shard = alias
+        with use_shard(alias):
+            return self.get_response(request)
+
+    @staticmethod
+    def _resolve(request, tenant):
+        """
+        Перевіряє тенанта запиту.
+
+        :return: Кортеж (аліас шарду, None) або (None, відповідь з помилкою).
+        """
+        alias = shard_for_tenant(tenant)
+        if alias is None:
+            return None, JsonResponse({'detail': f'Невідомий тенант: {tenant}.'}, status=404)
+        if not tenant_allowed(request.user, tenant):
+            return None, JsonResponse({'detail': f'Немає доступу до тенанта: {tenant}.'}, status=403)
+        if not is_migrated(alias):
+            return None, JsonResponse(
+                {'detail': f'Каталог тенанта {tenant} не створено: виконайте manage.py migrate_shards.'},
+                status=404,
+            )
+        return alias, None
+
+    @staticmethod
+    def _is_admin_path(path):
+        """ Чи належить шлях до адмінки (вибір тенанта через сесію — лише там). """
+        try:
+            return path.startswith(reverse('admin:index'))
+        except NoReverseMatch:
+            return False
+
+
+# --- Підтримка management-команд ---
+def add_shard_arguments(parser):
+    """ Додає до команди параметри `--shard` (можна кілька) та `--all-shards`. """
+    parser.add_argument('--shard', action='append', dest='shards', metavar='SHARD',
+                        help='Аліас бази або ключ тенанта (за замовчуванням шард за замовчуванням).')
+    parser.add_argument('--all-shards', action='store_true', help='Виконати для всіх шардів.')
+
+
+def selected_shards(options):
+    """
+    Повертає аліаси шардів, вибрані параметрами команди.
+
+    :raises ValueError: Якщо вказано невідомий шард або тенант.
+    """
+    if options.get('all_shards'):
+        return shard_aliases()
+    aliases = []
+    for name in options.get('shards') or [current_shard()]:
+        alias = resolve_shard(name)
+        if alias is None:
+            raise ValueError(f'Невідомий шард або тенант: {name}.')
+        aliases.append(alias)
+    return aliases
@@ -1,6 +1,7 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Product
+from .models import Product, Review
+from .sharding import use_shard
 import logging
 
 # Використовуємо кастомний логгер
@@ -31,3 +32,88 @@ def product_post_save_handler(sender, instance, created, **kwargs):
         logger.info(message)
     else:
         message = f"Продукт '{instance.name}' (ID: {instance.id}) оновлено."
+
+
+# --- Інкрементальне оновлення статистики ---
+@receiver(post_save, sender=Product)
+def product_stats_on_save(sender, instance, created, using, raw=False, **kwargs):
+    """
+    Оновлює rollup-статистику після створення продукту або зміни `is_active`.
+
+    Попереднє значення `is_active` береться із запам'ятованих значень
+    моделі (`loaded_value`), тому додатковий запит не потрібен.
+    Статистика оновлюється в тому ж шарді, куди збережено продукт.
+    """
+    if raw:
+        return
+    # Модулі статистики та знімка імпортуються при першій зміні, а не в ready()
+    from . import stats
+
+    with use_shard(using):
+        if created:
+            stats.product_created(instance)
+            return
+        was_active = instance.loaded_value('is_active')
+        if was_active is not None:
+            stats.product_activity_changed(was_active, instance.is_active)
+
+
+@receiver(post_delete, sender=Product)
+def product_stats_on_delete(sender, instance, using, **kwargs):
+    """ Прибирає видалений продукт зі статистики. """
+    from . import stats
+
+    with use_shard(using):
+        stats.product_deleted(instance)
+
+
+@receiver(post_save, sender=Review)
+def review_stats_on_save(sender, instance, created, using, raw=False, **kwargs):
+    """
+    Оновлює гістограму рейтингів та статистику продукту після збереження відгуку.
+
+    При зміні рейтингу або продукту старе значення віднімається,
+    а нове — додається.
+    """
+    if raw:
+        return
+    from . import stats
+
+    with use_shard(using):
+        if not created:
+            old_product_id = instance.loaded_value('product_id')
+            old_rating = instance.loaded_value('rating')
+            if old_product_id is None or old_rating is None:
+                return
+            if (old_product_id, old_rating) == (instance.product_id, instance.rating):
+                return
+            stats.review_removed(old_product_id, old_rating)
+        stats.review_added(instance.product_id, instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def review_stats_on_delete(sender, instance, using, **kwargs):
+    """ Прибирає видалений відгук зі статистики. """
+    from . import stats
+
+    with use_shard(using):
+        stats.review_removed(
+            instance.loaded_value('product_id', instance.product_id),
+            instance.loaded_value('rating', instance.rating),
+        )
+
+
+# --- Перебудова спільного знімка каталогу ---
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def catalogue_snapshot_on_change(sender, using, raw=False, **kwargs):
+    """
+    Планує перебудову знімка каталогу (шарду `using`) після коміту змін
+    продуктів/відгуків (лише якщо знімок увімкнено у налаштуваннях).
+    """
+    if not raw:
+        from . import snapshot
+
+        snapshot.schedule_rebuild(using)
@@ -0,0 +1,382 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from .sharding import current_shard, shard_aliases
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокування файлу знімка недоступне
+    fcntl = None
+
+logger = logging.getLogger('custom_app_logger')
+
+# Формат файлу: MAGIC, покоління бази (uint64), довжина заголовка (uint64),
+# JSON-заголовок, JSON-записи продуктів
+MAGIC = b'CSN2'
+PREAMBLE = struct.Struct('>4sQQ')
+
+# Налаштування за замовчуванням (перевизначаються словником settings.CATALOGUE_SNAPSHOT)
+DEFAULTS = {
+    'ENABLED': False,
+    'PATH': '',
+    # Затримка фонової перебудови після коміту, с (None — без фонового потоку:
+    # знімок перебудовує `build_catalogue_snapshot` з cron або `rebuild_pending()`)
+    'REBUILD_DELAY': 1.0,
+}
+
+_lock = threading.Lock()
+# Відкриті знімки (шлях -> CatalogueSnapshot) та callback-и позначки (шард -> callback)
+_readers = {}
+_dirty_callbacks = {}
+# Шарди, знімки яких застаріли (шард -> кількість комітів від останньої перебудови)
+_dirty = {}
+_dirty_lock = threading.Lock()
+_wakeup = threading.Event()
+_rebuilder = None
+# Шлях -> момент (monotonic), до якого не варто знову відкривати відсутній/пошкоджений файл
+_retry_at = {}
+# Замінені знімки (час заміни, знімок): закриваються, коли запити вже точно їх не читають
+_retired = []
+# Через скільки секунд повторювати відкриття відсутнього файлу та закривати замінений знімок
+RETRY_MISSING = 1.0
+RETIRE_AFTER = 30.0
+
+
+def _config():
+    """ Повертає налаштування з урахуванням settings.CATALOGUE_SNAPSHOT. """
+    return {**DEFAULTS, **getattr(settings, 'CATALOGUE_SNAPSHOT', {})}
+
+
+def is_enabled():
+    """ Чи ввімкнено спільний знімок каталогу. """
+    return bool(_config()['ENABLED'])
+
+
+def snapshot_path(using=None):
+    """
+    Шлях до знімка шарду `using` (за замовчуванням — поточного).
+
+    Шард за замовчуванням використовує CATALOGUE_SNAPSHOT['PATH'], інші —
+    той самий шлях з аліасом перед розширенням (`catalogue.catalogue_1.snapshot`).
+    """
+    using = using or current_shard()
+    path = str(_config()['PATH'])
+    if using == shard_aliases()[0]:
+        return path
+    root, extension = os.path.splitext(path)
+    return f'{root}.{using}{extension}'
+
+
+# --- Побудова знімка ---
+def current_generation(using=None):
+    """
+    Повертає покоління каталогу шарду — лічильник комітів, що змінювали каталог.
+
+    :param using: Аліас шарду (за замовчуванням — поточний).
+    """
+    from .models import CatalogueCounter
+
+    counters = CatalogueCounter.objects.using(using or current_shard())
+    return counters.filter(name=CatalogueCounter.SNAPSHOT_GENERATION).values_list('value', flat=True).first() or 0
+
+
+def _bump_generation(using):
+    """ Збільшує покоління каталогу шарду в поточній транзакції. """
+    from .models import CatalogueCounter
+
+    counters = CatalogueCounter.objects.using(using)
+    name = CatalogueCounter.SNAPSHOT_GENERATION
+    if not counters.filter(name=name).update(value=F('value') + 1):
+        _, created = counters.get_or_create(name=name, defaults={'value': 1})
+        if not created:
+            counters.filter(name=name).update(value=F('value') + 1)
+
+
+def file_generation(path):
+    """ Повертає покоління знімка у файлі `path` або None, якщо файлу немає чи він іншого формату. """
+    try:
+        with open(path, 'rb') as stream:
+            magic, generation, _ = PREAMBLE.unpack(stream.read(PREAMBLE.size))
+    except (FileNotFoundError, struct.error):
+        return None
+    return generation if magic == MAGIC else None
+
+
+@contextmanager
+def _file_lock(path):
+    """ Ексклюзивне блокування (`flock`) побудови знімка між процесами хоста. """
+    if fcntl is None:
+        yield
+        return
+    with open(f'{path}.lock', 'a') as stream:
+        fcntl.flock(stream.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(stream.fileno(), fcntl.LOCK_UN)
+
+
+def build_snapshot(path=None, using=None):
+    """
+    Будує знімок активних продуктів шарду і атомарно замінює файл.
+
+    Записи мають той самий вигляд, що й відповідь ProductSerializer, але
+    будуються з легких `ProductRow` та кортежів відгуків, без екземплярів
+    моделей і полів DRF. Продукти, відгуки та покоління читаються в одній
+    транзакції. Побудова й заміна файлу виконуються під `flock`, а якщо на
+    диску вже лежить знімок новішого покоління, файл не замінюється — так
+    повільніший воркер не перезапише свіжий знімок старим. Файл спершу
+    пишеться у тимчасовий файл у тій самій директорії, а потім підміняється
+    через `os.replace()`, тому читачі завжди бачать цілий знімок.
+
+    :param path: Шлях до файлу (за замовчуванням `snapshot_path(using)`).
+    :param using: Аліас шарду (за замовчуванням — поточний).
+    :return: Кількість продуктів у знімку або None, якщо на диску новіший знімок.
+    """
+    from .models import Product, Review
+    from .readmodels import iter_product_rows
+
+    using = using or current_shard()
+    path = path or snapshot_path(using)
+    with _file_lock(path):
+        offsets = []
+        names = {}
+        body = bytearray()
+        with transaction.atomic(using=using):
+            generation = current_generation(using)
+            on_disk = file_generation(path)
+            if on_disk is not None and on_disk > generation:
+                logger.info(f'Знімок каталогу {path} новіший ({on_disk} > {generation}), заміну пропущено.')
+                return None
+            reviews = {}
+            review_rows = (
+                Review.objects.using(using).filter(product__is_active=True)
+                .order_by('product_id', 'pk').values_list('product_id', 'id', 'text', 'rating')
+            )
+            for product_id, review_id, text, rating in review_rows.iterator():
+                reviews.setdefault(product_id, []).append({'id': review_id, 'text': text, 'rating': rating})
+
+            for row in iter_product_rows(Product.objects.using(using).filter(is_active=True)):
+                record = {
+                    'id': row.id, 'name': row.name, 'details': row.details, 'is_active': row.is_active,
+                    'version': row.version, 'reviews': reviews.pop(row.id, []),
+                }
+                encoded = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode()
+                offsets.append((record['id'], len(body), len(encoded)))
+                names.setdefault(record['name'], []).append(record['id'])
+                body += encoded
+
+        header = json.dumps({'offsets': offsets, 'names': names}, ensure_ascii=False).encode()
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalogue-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                stream.write(PREAMBLE.pack(MAGIC, generation, len(header)))
+                stream.write(header)
+                stream.write(body)
+                stream.flush()
+                os.fsync(stream.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    # Новий файл видно цьому процесу одразу, без очікування RETRY_MISSING
+    _retry_at.pop(path, None)
+    return len(offsets)
+
+
+# --- Відкладена перебудова ---
+def _mark_dirty(using):
+    """ Позначає знімок шарду застарілим і будить фоновий потік перебудови. """
+    with _dirty_lock:
+        _dirty[using] = _dirty.get(using, 0) + 1
+    if _config()['REBUILD_DELAY'] is not None:
+        _ensure_rebuilder()
+        _wakeup.set()
+
+
+def _dirty_callback(using):
+    """ Callback для `on_commit`, що позначає знімок шарду (один об'єкт на шард). """
+    if using not in _dirty_callbacks:
+        _dirty_callbacks[using] = partial(_mark_dirty, using)
+    return _dirty_callbacks[using]
+
+
+def schedule_rebuild(using=None):
+    """
+    Позначає знімок шарду застарілим після коміту поточної транзакції.
+
+    Покоління каталогу збільшується один раз на транзакцію, у ній самій. Сам знімок перебудовується не в запиті, а фоновим потоком процесу через
+    REBUILD_DELAY секунд, тож серія комітів за цей час дає одну перебудову.
+    При відкаті транзакції знімок не позначається.
+
+    :param using: Аліас шарду (за замовчуванням — поточний).
+    """
+    if not is_enabled():
+        return
+    using = using or current_shard()
+    callback = _dirty_callback(using)
+    connection = transaction.get_connection(using)
+    if any(func is callback for _, func, _ in connection.run_on_commit):
+        return
+    _bump_generation(using)
+    transaction.on_commit(callback, using=using)
+
+
+def rebuild_pending():
+    """
+    Перебудовує знімки всіх застарілих шардів у поточному потоці.
+
+    Помилки побудови записуються в лог і не поширюються: знімок лишається
+    попереднім, а наступний коміт позначить шард знову.
+
+    :return: Словник {аліас: кількість продуктів} для перебудованих шардів.
+    """
+    with _dirty_lock:
+        pending = list(_dirty)
+        _dirty.clear()
+    rebuilt = {}
+    for using in pending:
+        try:
+            rebuilt[using] = build_snapshot(using=using)
+        except Exception:
+            logger.exception(f'Не вдалося перебудувати знімок каталогу [{using}].')
+    return rebuilt
+
+
+def _run_rebuilder():
+    """ Цикл фонового потоку: чекає на позначки і перебудовує знімки пачками. """
+    while True:
+        _wakeup.wait()
+        time.sleep(_config()['REBUILD_DELAY'] or 0)
+        _wakeup.clear()
+        try:
+            rebuild_pending()
+        finally:
+            connections.close_all()
+
+
+def _ensure_rebuilder():
+    """ Запускає фоновий потік перебудови (після fork — заново у воркері). """
+    global _rebuilder
+    with _dirty_lock:
+        if _rebuilder is None or not _rebuilder.is_alive():
+            _rebuilder = threading.Thread(target=_run_rebuilder, name='catalogue-snapshot', daemon=True)
+            _rebuilder.start()
+
+
+# --- Читання знімка ---
+class CatalogueSnapshot:
+    """
+    Знімок каталогу, відображений у пам'ять (`mmap`, лише читання).
+
+    Усі воркери на хості відображають той самий файл, тому дані
+    зберігаються у page cache один раз. Декодуються лише записи,
+    які фактично повертаються клієнту.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as stream:
+            self.stat = os.fstat(stream.fileno())
+            self._mmap = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, self.generation, header_length = PREAMBLE.unpack_from(self._mmap, 0)
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f'Файл {path} не є знімком каталогу.')
+        start = PREAMBLE.size
+        header = json.loads(self._mmap[start:start + header_length])
+        self._body = start + header_length
+        self._offsets = {pk: (offset, length) for pk, offset, length in header['offsets']}
+        self._order = [pk for pk, _, _ in header['offsets']]
+        self._names = header['names']
+
+    def _record(self, pk):
+        offset, length = self._offsets[pk]
+        start = self._body + offset
+        return json.loads(self._mmap[start:start + length])
+
+    def get(self, pk):
+        """ Повертає продукт за ключем або None, якщо його немає у знімку. """
+        if pk not in self._offsets:
+            return None
+        return self._record(pk)
+
+    def list(self, name=None):
+        """
+        Повертає активні продукти (у порядку id), за потреби — з точною назвою.
+
+        :param name: Значення фільтра `name` або None.
+        """
+        pks = self._order if name is None else self._names.get(name, [])
+        return [self._record(pk) for pk in pks]
+
+    def is_current(self, path):
+        """ Чи відповідає цей знімок поточному файлу (файл не підмінено). """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) == (self.stat.st_ino, self.stat.st_mtime_ns)
+
+    def close(self):
+        self._mmap.close()
+
+
+def _retire(reader):
+    """
+    Відкладає закриття заміненого знімка і закриває ті, що замінені давно.
+
+    Запит, який уже отримав старий знімок, ще може з нього читати, тому
+    `mmap` закривається лише через RETIRE_AFTER секунд після заміни.
+    Викликається під `_lock`.
+    """
+    now = time.monotonic()
+    if reader is not None:
+        _retired.append((now, reader))
+    while _retired and now - _retired[0][0] >= RETIRE_AFTER:
+        _retired.pop(0)[1].close()
+
+
+def get_snapshot(using=None):
+    """
+    Повертає актуальний знімок каталогу шарду для поточного процесу.
+
+    Після атомарної підміни файлу знімок відкривається повторно, а старий
+    `mmap` закривається (див. `_retire`). Відсутній або пошкоджений файл
+    перевіряється знову не частіше ніж раз на RETRY_MISSING секунд.
+
+    :param using: Аліас шарду (за замовчуванням — поточний).
+    :return: `CatalogueSnapshot` або None, якщо знімок вимкнено чи його ще немає.
+    """
+    if not is_enabled():
+        return None
+    path = snapshot_path(using)
+    reader = _readers.get(path)
+    if reader is not None and reader.is_current(path):
+        return reader
+    if reader is None and time.monotonic() < _retry_at.get(path, 0):
+        return None
+    with _lock:
+        reader = _readers.get(path)
+        if reader is None or not reader.is_current(path):
+            try:
+                new_reader = CatalogueSnapshot(path)
+            except (FileNotFoundError, ValueError):
+                new_reader = None
+                _retry_at[path] = time.monotonic() + RETRY_MISSING
+            _retire(reader)
+            _readers[path] = reader = new_reader
+        return reader
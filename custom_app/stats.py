@@ -0,0 +1,316 @@
+import logging
+from collections import Counter
+from itertools import islice
+from django.db import router, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+from .models import (
+    CatalogueCounter, ProductDailyStats, ProductReviewStats, RatingHistogram, Review,
+)
+from .readmodels import iter_product_rows, DEFAULT_CHUNK_SIZE
+
+logger = logging.getLogger('custom_app_logger')
+
+# Допустимі інтервали групування для статистики створення продуктів
+BUCKETS = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def _bump(model, lookup, deltas):
+    """
+    Атомарно змінює лічильники рядка rollup-таблиці на задані значення.
+
+    Використовує `F()`-вирази, тому паралельні оновлення не губляться.
+    Якщо рядка ще немає і зміни додатні, рядок створюється; від'ємні зміни
+    для відсутнього рядка ігноруються (наприклад, якщо рядок уже видалено
+    каскадно разом із продуктом). Зменшення, після якого лічильник став би
+    від'ємним, означає, що дані змінено в обхід сигналів і пакетних функцій
+    нижче: воно застосовується як є і записується в лог як попередження,
+    а точні значення відновлює `rebuild_stats`.
+
+    :param model: Модель rollup-таблиці.
+    :param lookup: Словник для пошуку рядка (унікальний ключ).
+    :param deltas: Словник {поле: зміна}.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    rows = model.objects.filter(**lookup)
+    # Для зменшень UPDATE застосовується лише до рядка, де лічильник не стане від'ємним
+    guard = {f'{field}__gte': -delta for field, delta in deltas.items() if delta < 0}
+    if rows.filter(**guard).update(**updates):
+        return
+    if guard:
+        if rows.update(**updates):
+            logger.warning(
+                f'Лічильник {model.__name__} {lookup} став від\'ємним після зміни {deltas}: '
+                f'дані змінено в обхід статистики, запустіть rebuild_stats.'
+            )
+        return
+    _, created = model.objects.get_or_create(**lookup, defaults=deltas)
+    if not created:
+        # Рядок створив паралельний запис між UPDATE та INSERT
+        rows.update(**updates)
+
+
+def _activity_counter(is_active):
+    """ Повертає назву лічильника для активних/неактивних продуктів. """
+    return CatalogueCounter.ACTIVE_PRODUCTS if is_active else CatalogueCounter.INACTIVE_PRODUCTS
+
+
+# --- Інкрементальні оновлення (викликаються з сигналів) ---
+def product_created(product):
+    """ Враховує новий продукт у лічильниках та денній статистиці. """
+    _bump(CatalogueCounter, {'name': _activity_counter(product.is_active)}, {'value': 1})
+    _bump(ProductDailyStats, {'day': timezone.localdate(product.created_at)}, {'created_count': 1})
+
+
+def product_activity_changed(was_active, is_active, count=1):
+    """
+    Переносить `count` продуктів між лічильниками активних та неактивних.
+
+    Використовується також для масових `queryset.update(is_active=...)`,
+    які не надсилають сигналів.
+    """
+    if was_active == is_active or not count:
+        return
+    _bump(CatalogueCounter, {'name': _activity_counter(was_active)}, {'value': -count})
+    _bump(CatalogueCounter, {'name': _activity_counter(is_active)}, {'value': count})
+
+
+def product_deleted(product):
+    """ Прибирає видалений продукт з лічильників та денної статистики. """
+    is_active = product.loaded_value('is_active', product.is_active)
+    _bump(CatalogueCounter, {'name': _activity_counter(is_active)}, {'value': -1})
+    if product.created_at:
+        _bump(ProductDailyStats, {'day': timezone.localdate(product.created_at)}, {'created_count': -1})
+
+
+def review_added(product_id, rating):
+    """ Враховує відгук у гістограмі рейтингів та статистиці продукту. """
+    _bump(RatingHistogram, {'rating': rating}, {'review_count': 1})
+    _bump(ProductReviewStats, {'product_id': product_id}, {'review_count': 1, 'rating_sum': rating})
+
+
+def review_removed(product_id, rating):
+    """ Прибирає відгук з гістограми рейтингів та статистики продукту. """
+    _bump(RatingHistogram, {'rating': rating}, {'review_count': -1})
+    _bump(ProductReviewStats, {'product_id': product_id}, {'review_count': -1, 'rating_sum': -rating})
+
+
+# --- Пакетні оновлення (для bulk_create та масового видалення без сигналів) ---
+def _apply_products(products, sign):
+    activity = Counter(_activity_counter(product.is_active) for product in products)
+    days = Counter(timezone.localdate(product.created_at) for product in products if product.created_at)
+    for name, count in activity.items():
+        _bump(CatalogueCounter, {'name': name}, {'value': sign * count})
+    for day, count in days.items():
+        _bump(ProductDailyStats, {'day': day}, {'created_count': sign * count})
+
+
+def products_added(products):
+    """
+    Враховує пачку продуктів, створених без сигналів (`bulk_create`).
+
+    Зміни групуються, тому кількість запитів залежить лише від кількості
+    різних лічильників і днів, а не від кількості продуктів.
+
+    :param products: Екземпляри Product або `ProductRow`.
+    """
+    _apply_products(products, 1)
+
+
+def products_removed(products):
+    """ Прибирає пачку продуктів, видалених без сигналів (див. `products_added`). """
+    _apply_products(products, -1)
+
+
+def _apply_reviews(reviews, sign, per_product=True):
+    ratings = Counter()
+    totals_by_product = {}
+    for product_id, rating in reviews:
+        ratings[rating] += 1
+        if per_product:
+            totals = totals_by_product.setdefault(product_id, [0, 0])
+            totals[0] += 1
+            totals[1] += rating
+    for rating, count in ratings.items():
+        _bump(RatingHistogram, {'rating': rating}, {'review_count': sign * count})
+    for product_id, (count, total) in totals_by_product.items():
+        _bump(ProductReviewStats, {'product_id': product_id},
+              {'review_count': sign * count, 'rating_sum': sign * total})
+
+
+def reviews_added(reviews):
+    """
+    Враховує пачку відгуків, створених без сигналів.
+
+    :param reviews: Пари (product_id, rating).
+    """
+    _apply_reviews(reviews, 1)
+
+
+def reviews_removed(reviews, per_product=True):
+    """
+    Прибирає пачку відгуків, видалених без сигналів.
+
+    :param reviews: Пари (product_id, rating).
+    :param per_product: False — не оновлювати ProductReviewStats (наприклад,
+                        коли ці рядки видалено разом із продуктами).
+    """
+    _apply_reviews(reviews, -1, per_product)
+
+
+# --- Повний перерахунок ---
+def rebuild_statistics(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Перераховує всі rollup-таблиці з нуля.
+
+    Продукти читаються пакетами через легкі `ProductRow`, а не як екземпляри
+    моделей. Відгуки агрегуються в базі (`GROUP BY`), а підсумки по продуктах
+    записуються пакетами прямо з курсора, тож пам'ять не залежить від
+    кількості продуктів з відгуками. Працює з шардом поточного контексту
+    (`sharding.use_shard`).
+
+    :param chunk_size: Кількість рядків, що читаються/записуються за один раз.
+    :return: Словник з кількістю оброблених продуктів та відгуків.
+    """
+    # Транзакція в шарді, з якого читаються продукти (див. TenantRouter)
+    with transaction.atomic(using=router.db_for_write(CatalogueCounter)):
+        activity = Counter()
+        days = Counter()
+        product_count = 0
+        for row in iter_product_rows(with_details=False, chunk_size=chunk_size):
+            activity[_activity_counter(row.is_active)] += 1
+            days[timezone.localdate(row.created_at)] += 1
+            product_count += 1
+
+        ratings = dict(
+            Review.objects.order_by().values('rating').annotate(count=Count('pk')).values_list('rating', 'count')
+        )
+
+        activity_names = (CatalogueCounter.ACTIVE_PRODUCTS, CatalogueCounter.INACTIVE_PRODUCTS)
+        # Покоління знімка не є статистикою і не скидається
+        CatalogueCounter.objects.filter(name__in=activity_names).delete()
+        ProductDailyStats.objects.all().delete()
+        RatingHistogram.objects.all().delete()
+        ProductReviewStats.objects.all().delete()
+
+        CatalogueCounter.objects.bulk_create(
+            CatalogueCounter(name=name, value=activity[name]) for name in activity_names
+        )
+        ProductDailyStats.objects.bulk_create(
+            (ProductDailyStats(day=day, created_count=count) for day, count in days.items()),
+            batch_size=chunk_size,
+        )
+        RatingHistogram.objects.bulk_create(
+            RatingHistogram(rating=rating, review_count=count) for rating, count in ratings.items()
+        )
+        per_product = (
+            Review.objects.order_by('product_id').values('product_id')
+            .annotate(count=Count('pk'), total=Sum('rating'))
+            .values_list('product_id', 'count', 'total')
+            .iterator(chunk_size=chunk_size)
+        )
+        while batch := list(islice(per_product, chunk_size)):
+            ProductReviewStats.objects.bulk_create(
+                ProductReviewStats(product_id=product_id, review_count=count, rating_sum=total)
+                for product_id, count, total in batch
+            )
+    return {'products': product_count, 'reviews': sum(ratings.values())}
+
+
+# --- Читання статистики (лише з rollup-таблиць) ---
+def catalogue_counts():
+    """ Повертає кількість активних та неактивних продуктів. """
+    values = dict(CatalogueCounter.objects.values_list('name', 'value'))
+    return {
+        'active': values.get(CatalogueCounter.ACTIVE_PRODUCTS, 0),
+        'inactive': values.get(CatalogueCounter.INACTIVE_PRODUCTS, 0),
+    }
+
+
+def created_per_bucket_queryset(bucket='day', since=None, until=None):
+    """
+    Будує запит кількості створених продуктів, згрупованої за інтервалом.
+
+    :param bucket: 'day', 'week' або 'month'.
+    :param since: Перший день діапазону (включно) або None.
+    :param until: Останній день діапазону (включно) або None.
+    :return: QuerySet кортежів (початок інтервалу, кількість).
+    """
+    queryset = ProductDailyStats.objects.all()
+    if since:
+        queryset = queryset.filter(day__gte=since)
+    if until:
+        queryset = queryset.filter(day__lte=until)
+
+    trunc = BUCKETS[bucket]
+    if trunc is None:
+        return queryset.order_by('day').values_list('day', 'created_count')
+    return (
+        queryset.annotate(period=trunc('day'))
+        .values('period')
+        .annotate(count=Sum('created_count'))
+        .order_by('period')
+        .values_list('period', 'count')
+    )
+
+
+def created_per_bucket(bucket='day', since=None, until=None):
+    """
+    Повертає кількість створених продуктів, згруповану за інтервалом.
+
+    Параметри такі самі, як у `created_per_bucket_queryset()`.
+
+    :return: Список словників {'period': date, 'count': int} за зростанням дати.
+    """
+    rows = created_per_bucket_queryset(bucket, since, until)
+    return [{'period': period, 'count': count} for period, count in rows if count]
+
+
+def rating_histogram():
+    """ Повертає словник {рейтинг: кількість відгуків}. """
+    return dict(
+        RatingHistogram.objects.filter(review_count__gt=0)
+        .order_by('rating')
+        .values_list('rating', 'review_count')
+    )
+
+
+def top_products_queryset(limit=10):
+    """
+    Будує запит продуктів з найбільшою кількістю відгуків.
+
+    :param limit: Кількість продуктів у рейтингу.
+    :return: QuerySet ProductReviewStats з підвантаженою назвою продукту.
+    """
+    return (
+        ProductReviewStats.objects.filter(review_count__gt=0)
+        .select_related('product')
+        .only('review_count', 'rating_sum', 'product__name')
+        .order_by('-review_count', 'product_id')[:limit]
+    )
+
+
+def top_products(limit=10):
+    """
+    Повертає продукти з найбільшою кількістю відгуків.
+
+    :param limit: Кількість продуктів у рейтингу.
+    :return: Список словників з id, назвою, кількістю відгуків та середнім рейтингом.
+    """
+    return [
+        {
+            'id': item.product_id,
+            'name': item.product.name,
+            'review_count': item.review_count,
+            'average_rating': item.average_rating,
+        }
+        for item in top_products_queryset(limit)
+    ]
@@ -0,0 +1,263 @@
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase
+from django.test.runner import DiscoverRunner, ParallelTestSuite
+from django.test.utils import CaptureQueriesContext, override_settings
+from .models import CustomUser, Product, Review
+
+# Множник бюджетів часу в assertFasterThan (для повільних CI-машин)
+LATENCY_FACTOR = float(os.environ.get('TEST_LATENCY_FACTOR', 1))
+
+# Спільний лічильник для унікальних значень у фабриках
+_sequence = itertools.count(1)
+
+
+# --- Фабрики ---
+class Factory:
+    """
+    Мінімальна фабрика тестових об'єктів (у дусі factory_boy, без залежності).
+
+    Підкласи задають `model` (або `get_model()`) та `defaults(n)`, де `n` —
+    унікальний номер об'єкта; будь-яке поле можна перевизначити аргументом.
+    """
+    model = None
+
+    @classmethod
+    def get_model(cls):
+        return cls.model
+
+    @classmethod
+    def defaults(cls, n):
+        return {}
+
+    @classmethod
+    def build(cls, **overrides):
+        """ Створює незбережений екземпляр. """
+        return cls.get_model()(**{**cls.defaults(next(_sequence)), **overrides})
+
+    @classmethod
+    def create(cls, **overrides):
+        """ Створює і зберігає екземпляр (із сигналами). """
+        instance = cls.build(**overrides)
+        instance.save()
+        return instance
+
+    @classmethod
+    def create_batch(cls, size, **overrides):
+        """
+        Створює `size` екземплярів одним `bulk_create`.
+
+        Сигнали не надсилаються, тому побічні ефекти збереження (rollup-
+        статистику) підкласи застосовують пакетом у `after_bulk_create`.
+        """
+        instances = cls.get_model().objects.bulk_create([cls.build(**overrides) for _ in range(size)])
+        cls.after_bulk_create(instances)
+        return instances
+
+    @classmethod
+    def after_bulk_create(cls, instances):
+        """ Замінює сигнали `post_save` для об'єктів, створених `create_batch`. """
+
+
+class ProductFactory(Factory):
+    model = Product
+
+    @classmethod
+    def defaults(cls, n):
+        return {'name': f'product {n}', 'details': {'sku': n, 'color': 'red'}}
+
+    @classmethod
+    def after_bulk_create(cls, instances):
+        from .stats import products_added
+
+        products_added(instances)
+
+
+class ReviewFactory(Factory):
+    model = Review
+
+    @classmethod
+    def defaults(cls, n):
+        return {'text': f'review {n}', 'rating': n % 5 + 1}
+
+    @classmethod
+    def build(cls, **overrides):
+        if 'product' not in overrides and 'product_id' not in overrides:
+            overrides['product'] = ProductFactory.create()
+        return super().build(**overrides)
+
+    @classmethod
+    def after_bulk_create(cls, instances):
+        from .stats import reviews_added
+
+        reviews_added((review.product_id, review.rating) for review in instances)
+
+
+class UserFactory(Factory):
+    """ Користувач моделі AUTH_USER_MODEL (пароль — `secret`). """
+
+    @classmethod
+    def get_model(cls):
+        return get_user_model()
+
+    @classmethod
+    def defaults(cls, n):
+        return {'username': f'user{n}', 'email': f'user{n}@example.com'}
+
+    @classmethod
+    def build(cls, password='secret', **overrides):
+        user = super().build(**overrides)
+        user.set_password(password)
+        return user
+
+
+class CustomUserFactory(UserFactory):
+    """ Користувач моделі `CustomUser` з унікальним номером телефону. """
+
+    model = CustomUser
+
+    @classmethod
+    def get_model(cls):
+        return cls.model
+
+    @classmethod
+    def defaults(cls, n):
+        return {**super().defaults(n), 'phone_number': f'+380{n:09d}'}
+
+
+def create_catalogue(products=20, reviews_per_product=3, inactive=0):
+    """
+    Швидко наповнює каталог через `bulk_create` з пакетним оновленням статистики.
+
+    :param products: Кількість активних продуктів.
+    :param reviews_per_product: Кількість відгуків у кожного активного продукту.
+    :param inactive: Кількість неактивних продуктів.
+    :return: Список активних продуктів.
+    """
+    active = ProductFactory.create_batch(products)
+    ProductFactory.create_batch(inactive, is_active=False)
+    reviews = Review.objects.bulk_create([
+        ReviewFactory.build(product=product) for product in active for _ in range(reviews_per_product)
+    ])
+    ReviewFactory.after_bulk_create(reviews)
+    return active
+
+
+# --- Перевірки продуктивності ---
+class PerformanceAssertionsMixin:
+    """
+    Перевірки кількості SQL-запитів та часу виконання для TestCase.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, maximum, using=DEFAULT_DB_ALIAS):
+        """ Падає, якщо всередині блоку виконано більше `maximum` SQL-запитів. """
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > maximum:
+            queries = '\n'.join(f'{i}. {query["sql"]}' for i, query in enumerate(context.captured_queries, 1))
+            self.fail(f'Виконано {executed} SQL-запитів, дозволено не більше {maximum}:\n{queries}')
+
+    def assertConstantQueries(self, action, grow, using=DEFAULT_DB_ALIAS):
+        """
+        Перевіряє відсутність N+1: кількість запитів `action()` не змінюється
+        після `grow()` (яка додає дані).
+        """
+        with CaptureQueriesContext(connections[using]) as before:
+            action()
+        grow()
+        with CaptureQueriesContext(connections[using]) as after:
+            action()
+        self.assertEqual(
+            len(after.captured_queries), len(before.captured_queries),
+            'Кількість SQL-запитів зростає разом із даними (N+1).',
+        )
+
+    @contextmanager
+    def assertFasterThan(self, milliseconds):
+        """
+        Падає, якщо блок виконувався довше за бюджет `milliseconds`.
+
+        Бюджет множиться на змінну оточення TEST_LATENCY_FACTOR.
+        """
+        budget = milliseconds * LATENCY_FACTOR
+        started = time.perf_counter()
+        yield
+        elapsed = (time.perf_counter() - started) * 1000
+        if elapsed > budget:
+            self.fail(f'Виконання тривало {elapsed:.1f} мс при бюджеті {budget:.1f} мс.')
+
+
+class CatalogueTestCase(PerformanceAssertionsMixin, TestCase):
+    """
+    TestCase зі спільним каталогом, створеним один раз на клас.
+
+    Дані з `setUpTestData` створюються в транзакції класу, а кожен тест
+    працює у власній точці збереження, тож каталог не перебудовується для
+    кожного тесту. Розмір задається атрибутами класу.
+    """
+    CATALOGUE_PRODUCTS = 20
+    CATALOGUE_REVIEWS_PER_PRODUCT = 3
+    CATALOGUE_INACTIVE = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_catalogue(
+            cls.CATALOGUE_PRODUCTS, cls.CATALOGUE_REVIEWS_PER_PRODUCT, cls.CATALOGUE_INACTIVE,
+        )
+        cls.staff = UserFactory.create(is_staff=True, is_superuser=True)
+
+
+# --- Запуск тестів ---
+def _test_settings_override():
+    """
+    Налаштування, що прискорюють тести: швидкий хешер паролів і вимкнене
+    трасування запитів (тести трасування вмикають його через override_settings).
+    """
+    return override_settings(
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        TRACING={**getattr(settings, 'TRACING', {}), 'ENABLED': False},
+    )
+
+
+def _enable_test_settings(*args):
+    """
+    Хук `ParallelTestSuite.process_setup`: вмикає тестові налаштування у
+    воркері, запущеному через spawn (він не успадковує змін головного процесу).
+    Діє до завершення процесу воркера.
+    """
+    _test_settings_override().enable()
+
+
+class FastParallelTestSuite(ParallelTestSuite):
+    """ ParallelTestSuite, воркери якого отримують тестові налаштування раннера. """
+    process_setup = _enable_test_settings
+
+
+class FastTestRunner(DiscoverRunner):
+    """
+    Тест-раннер проєкту (settings.TEST_RUNNER).
+
+    Використовує швидкий хешер паролів і вимикає трасування запитів, щоб
+    вони не впливали на час тестів: налаштування вмикаються через
+    `override_settings` на час тестового оточення, а у воркерах `--parallel`
+    зі spawn — хуком `process_setup`. Паралельний запуск вмикається
+    стандартним `--parallel` (тоді варто встановити tblib для передачі
+    трасувань між процесами).
+    """
+    parallel_test_suite = FastParallelTestSuite
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._settings_override = _test_settings_override()
+        self._settings_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._settings_override.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,954 @@
+import io
+import json
+import time
+from unittest import mock
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from .models import Product, Review, ArchivedProduct, CatalogueCounter, ConcurrentUpdateError
+from .readmodels import ProductRow, iter_product_rows
+from . import snapshot, stats
+from .testing import (
+    CatalogueTestCase, CustomUserFactory, PerformanceAssertionsMixin, ProductFactory, ReviewFactory, UserFactory,
+    create_catalogue,
+)
+
+
+class ProductDerivedValuesTests(TestCase):
+    """ Тести кешування похідних значень моделі Product. """
+
+    def test_name_length_is_invalidated_on_change(self):
+        product = Product(name='abc')
+        self.assertEqual(product.get_name_length(), 3)
+        product.name = 'abcdef'
+        self.assertEqual(product.get_name_length(), 6)
+
+    def test_string_details_are_decoded_once(self):
+        product = Product(name='p', details='{"a": 1, "b": 2}')
+        self.assertEqual(product.count_details_keys(), 2)
+        self.assertIs(product._decoded_details(), product._decoded_details())
+        product.details = '[1, 2, 3]'
+        self.assertEqual(product.count_details_keys(), 3)
+
+    def test_in_place_details_mutation_is_visible(self):
+        product = Product(name='p', details={'a': 1})
+        self.assertEqual(product.count_details_keys(), 1)
+        product.details['b'] = 2
+        self.assertEqual(product.count_details_keys(), 2)
+
+    def test_refresh_from_db_recomputes_values(self):
+        product = Product.objects.create(name='abc')
+        self.assertEqual(product.get_name_length(), 3)
+        Product.objects.filter(pk=product.pk).update(name='abcdef')
+        product.refresh_from_db()
+        self.assertEqual(product.get_name_length(), 6)
+
+
+class ReviewInlineQueryCountTests(TestCase):
+    """ Кількість запитів inline-відгуків не залежить від кількості відгуків. """
+
+    def setUp(self):
+        admin = UserFactory.create(is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+
+    def _change_page_queries(self, review_count):
+        product = Product.objects.create(name='product')
+        Review.objects.bulk_create(
+            Review(product=product, text=f'review {i}', rating=4) for i in range(review_count)
+        )
+        url = reverse('admin:custom_app_product_change', args=[product.pk])
+        ContentType.objects.clear_cache()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_inline_renders_reviews_in_constant_queries(self):
+        self.assertEqual(self._change_page_queries(2), self._change_page_queries(20))
+
+
+class ProductReadModelTests(TestCase):
+    """ Тести легкої read-моделі ProductRow та команди експорту. """
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.create(name='first', details={'a': 1})
+        Product.objects.create(name='second', is_active=False)
+
+    def test_rows_are_tuples_without_instance_dict(self):
+        rows = list(iter_product_rows(chunk_size=1))
+        self.assertEqual([row.name for row in rows], ['FIRST', 'SECOND'])
+        self.assertIsInstance(rows[0], tuple)
+        self.assertFalse(hasattr(rows[0], '__dict__'))
+        self.assertEqual(rows[0].details, {'a': 1})
+
+    def test_rows_without_details(self):
+        row = next(iter_product_rows(with_details=False))
+        self.assertIsNone(row.details)
+
+    def test_export_jsonl(self):
+        out = io.StringIO()
+        call_command('export_products', '--active-only', stdout=out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(set(lines[0]), set(ProductRow._fields))
+
+    def test_export_endpoint_streams_product_rows(self):
+        Product.objects.create(name='third', details={'b': 2})
+        response = self.client.get('/api/products/export/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line['name'] for line in lines], ['FIRST', 'THIRD'])
+        self.assertEqual(set(lines[0]), set(ProductRow._fields))
+
+        filtered = self.client.get('/api/products/export/', {'name': 'THIRD'})
+        self.assertEqual(len(b''.join(filtered.streaming_content).splitlines()), 1)
+
+
+class StartupTests(TestCase):
+    """ Тести лінивих запитів views та прогріву воркера. """
+
+    def test_module_querysets_are_built_lazily(self):
+        import importlib.util
+
+        # Свіжа копія модуля (sys.modules і URLconf не змінюються)
+        spec = importlib.util.find_spec('custom_app.views')
+        views = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(views)
+
+        self.assertNotIn('high_rated_products', vars(views))
+        self.assertNotIn('filtered_products', vars(views))
+        queryset = views.high_rated_products
+        self.assertIs(vars(views)['high_rated_products'], queryset)
+        self.assertIs(views.high_rated_products, queryset)
+        self.assertNotIn('filtered_products', vars(views))
+        with self.assertRaises(AttributeError):
+            views.missing_queryset
+
+    def test_warm_up_does_not_query_database(self):
+        from .warmup import warm_up
+
+        with self.assertNumQueries(0):
+            warm_up()
+
+
+class IncrementalStatsTests(TestCase):
+    """ Інкрементальна статистика збігається з повним перерахунком. """
+
+    def _snapshot(self):
+        return (
+            stats.catalogue_counts(),
+            stats.created_per_bucket(),
+            stats.rating_histogram(),
+            stats.top_products(),
+        )
+
+    def test_incremental_updates_match_rebuild(self):
+        first = Product.objects.create(name='first')
+        second = Product.objects.create(name='second')
+        review = Review.objects.create(product=first, text='ok', rating=3)
+        Review.objects.create(product=first, text='good', rating=5)
+        Review.objects.create(product=second, text='bad', rating=1)
+
+        review.rating = 4
+        review.save()
+        second.is_active = False
+        second.save()
+        Product.objects.get(pk=second.pk).delete()
+
+        incremental = self._snapshot()
+        self.assertEqual(incremental[0], {'active': 1, 'inactive': 0})
+        self.assertEqual(incremental[2], {4: 1, 5: 1})
+        self.assertEqual(incremental[3][0]['review_count'], 2)
+
+        stats.rebuild_statistics()
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_stats_endpoint(self):
+        product = Product.objects.create(name='first')
+        Review.objects.create(product=product, text='ok', rating=5)
+
+        response = self.client.get('/api/stats/', {'bucket': 'month', 'top': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['products'], {'active': 1, 'inactive': 0})
+        self.assertEqual(response.data['created'][0]['count'], 1)
+        self.assertEqual(response.data['top_products'][0]['id'], product.pk)
+
+        self.assertEqual(self.client.get('/api/stats/', {'bucket': 'year'}).status_code, 400)
+
+    def test_factory_batches_keep_stats_consistent(self):
+        products = ProductFactory.create_batch(3)
+        ReviewFactory.create_batch(2, product=products[0], rating=4)
+        incremental = self._snapshot()
+        self.assertEqual(incremental[0], {'active': 3, 'inactive': 0})
+
+        stats.rebuild_statistics()
+        self.assertEqual(self._snapshot(), incremental)
+        Product.objects.filter(pk__in=[product.pk for product in products]).delete()
+        self.assertEqual(stats.catalogue_counts(), {'active': 0, 'inactive': 0})
+
+    def test_negative_counter_is_logged(self):
+        Product.objects.create(name='kept')
+        # bulk_create в обхід stats.products_added
+        Product.objects.bulk_create([Product(name='bulk'), Product(name='bulk')])
+        with self.assertLogs('custom_app_logger', 'WARNING') as logs:
+            Product.objects.filter(name='BULK').delete()
+        self.assertIn('rebuild_stats', logs.output[0])
+        self.assertEqual(stats.catalogue_counts(), {'active': -1, 'inactive': 0})
+
+        stats.rebuild_statistics()
+        self.assertEqual(stats.catalogue_counts(), {'active': 1, 'inactive': 0})
+
+    def test_benchmark_populate_is_stats_neutral(self):
+        Product.objects.create(name='kept')
+        call_command('benchmark_product_rows', populate=5, stdout=io.StringIO())
+        self.assertEqual(Product.objects.count(), 1)
+        self.assertEqual(stats.catalogue_counts(), {'active': 1, 'inactive': 0})
+
+
+class OptimisticLockingTests(TestCase):
+    """ Тести версіонування продуктів та часткових оновлень. """
+
+    def setUp(self):
+        self.product = Product.objects.create(name='product', details={'a': 1})
+
+    def test_stale_instance_raises_conflict(self):
+        first = Product.objects.get(pk=self.product.pk)
+        second = Product.objects.get(pk=self.product.pk)
+        first.name = 'first'
+        first.save()
+        self.assertEqual(first.version, 2)
+
+        second.name = 'second'
+        with self.assertRaises(ConcurrentUpdateError):
+            second.save()
+
+    def test_only_changed_columns_are_written(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.is_active = False
+        with CaptureQueriesContext(connection) as ctx:
+            product.save()
+        claim, sql = (query['sql'] for query in ctx.captured_queries[:2])
+        self.assertIn('"version" = 1', claim)
+        self.assertIn('"is_active"', sql)
+        self.assertNotIn('"details"', sql)
+        self.assertNotIn('"name"', sql)
+
+    def test_in_place_details_change_is_saved(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.details['b'] = 2
+        product.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).details, {'a': 1, 'b': 2})
+
+    def test_loading_does_not_serialize_details(self):
+        with mock.patch('json.dumps', side_effect=AssertionError('json.dumps при завантаженні')):
+            product = Product.objects.get(pk=self.product.pk)
+        product.details['b'] = 2
+        self.assertEqual(product.changed_fields(), ['details'])
+
+    def test_unchanged_save_skips_update(self):
+        product = Product.objects.get(pk=self.product.pk)
+        with self.assertNumQueries(0):
+            product.save()
+
+    def test_deferred_field_load_keeps_unsaved_changes(self):
+        product = Product.objects.only('id', 'name', 'version').get(pk=self.product.pk)
+        product.name = 'changed'
+        product.details  # неявне часткове refresh_from_db()
+        product.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).name, 'CHANGED')
+
+    def test_partial_refresh_keeps_unsaved_changes(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = 'changed'
+        product.refresh_from_db(fields=['is_active'])
+        product.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).name, 'CHANGED')
+
+    def test_consecutive_partial_saves_track_version(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = 'one'
+        product.save(update_fields=['name'])
+        product.is_active = False
+        product.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).version, 3)
+
+
+class ProductApiPreconditionTests(TestCase):
+    """ Тести заголовків ETag / If-Match у ProductViewSet. """
+
+    def setUp(self):
+        staff = UserFactory.create(is_staff=True)
+        self.client.force_login(staff)
+        self.product = Product.objects.create(name='product')
+        self.url = f'/api/products/{self.product.pk}/'
+
+    def test_retrieve_returns_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], f'"{self.product.pk}-1"')
+
+    def test_if_match_mismatch_returns_412(self):
+        response = self.client.patch(
+            self.url, {'is_active': False}, content_type='application/json',
+            headers={'If-Match': f'"{self.product.pk}-7"'},
+        )
+        self.assertEqual(response.status_code, 412)
+
+    def test_if_match_success_bumps_version(self):
+        response = self.client.patch(
+            self.url, {'name': 'renamed'}, content_type='application/json',
+            headers={'If-Match': f'"{self.product.pk}-1"'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{self.product.pk}-2"')
+        self.assertEqual(response.data['version'], 2)
+
+
+class ProductAdminFormTests(TestCase):
+    """ Адмінка відхиляє збереження застарілої форми продукту. """
+
+    def test_stale_form_is_rejected(self):
+        from .forms import ProductAdminForm
+
+        product = Product.objects.create(name='product')
+        data = {'name': 'renamed', 'details': '{}', 'is_active': True, 'loaded_version': 1}
+        Product.objects.filter(pk=product.pk).update(version=2)
+        form = ProductAdminForm(data, instance=Product.objects.get(pk=product.pk))
+        self.assertFalse(form.is_valid())
+
+    def test_conflict_during_save_redirects_with_error(self):
+        from .admin import ProductAdmin
+
+        self.client.force_login(UserFactory.create(is_staff=True, is_superuser=True))
+        product = Product.objects.create(name='product')
+        original = ProductAdmin.save_model
+
+        def save_after_concurrent_update(admin, request, obj, form, change):
+            # Паралельний запис між clean() і save_model()
+            Product.objects.filter(pk=obj.pk).update(version=F('version') + 1)
+            return original(admin, request, obj, form, change)
+
+        url = reverse('admin:custom_app_product_change', args=[product.pk])
+        data = {
+            'name': 'renamed', 'details': '{"a": 1}', 'is_active': 'on', 'loaded_version': 1,
+            'reviews-TOTAL_FORMS': 0, 'reviews-INITIAL_FORMS': 0,
+        }
+        with mock.patch.object(ProductAdmin, 'save_model', save_after_concurrent_update):
+            response = self.client.post(url, data, follow=True)
+
+        self.assertRedirects(response, url)
+        self.assertContains(response, 'Зміни не збережено')
+        self.assertEqual(Product.objects.get(pk=product.pk).name, 'PRODUCT')
+
+
+class ArchiveTests(PerformanceAssertionsMixin, TestCase):
+    """ Тести архівації неактивних продуктів. """
+
+    def setUp(self):
+        self.active = Product.objects.create(name='active')
+        self.inactive = Product.objects.create(name='inactive', is_active=False)
+        Review.objects.create(product=self.inactive, text='old', rating=2)
+
+    def test_command_moves_inactive_products_and_reviews(self):
+        out = io.StringIO()
+        call_command('archive_products', '--batch-size', '1', stdout=out)
+
+        self.assertEqual(list(Product.objects.values_list('pk', flat=True)), [self.active.pk])
+        self.assertFalse(Review.objects.exists())
+        archived = ArchivedProduct.objects.get(pk=self.inactive.pk)
+        self.assertEqual(archived.name, 'INACTIVE')
+        self.assertEqual(archived.reviews.get().text, 'old')
+        self.assertEqual(stats.catalogue_counts(), {'active': 1, 'inactive': 0})
+
+    def test_batch_rechecks_condition_and_updates_stats(self):
+        from .archive import archivable_products, archive_batch
+
+        queryset = archivable_products()
+        pks = list(queryset.values_list('pk', flat=True))
+        Product.objects.filter(pk=self.inactive.pk).update(is_active=True)
+
+        self.assertEqual(archive_batch(pks, queryset), (0, 0))
+        self.assertFalse(ArchivedProduct.objects.exists())
+
+        Product.objects.filter(pk=self.inactive.pk).update(is_active=False)
+        with self.assertMaxQueries(12):
+            self.assertEqual(archive_batch(pks, queryset), (1, 1))
+        self.assertEqual(stats.rating_histogram(), {})
+        self.assertEqual(stats.top_products(), [])
+        stats_before_rebuild = stats.catalogue_counts()
+        stats.rebuild_statistics()
+        self.assertEqual(stats.catalogue_counts(), stats_before_rebuild)
+
+    def test_archived_products_are_readable_through_api(self):
+        call_command('archive_products', stdout=io.StringIO())
+
+        url = f'/api/products/{self.inactive.pk}/'
+        self.assertEqual(self.client.get(url, {'archived': 'true'}).status_code, 403)
+        self.client.force_login(UserFactory.create())
+        self.assertEqual(self.client.get(url, {'archived': 'true'}).status_code, 403)
+
+        self.client.force_login(UserFactory.create(is_staff=True))
+        response = self.client.get(url, {'archived': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['reviews'][0]['rating'], 2)
+        self.assertEqual(self.client.get(f'/api/products/{self.inactive.pk}/').status_code, 404)
+
+
+class ExplainHotQueriesTests(TestCase):
+    """ Тести аналізу планів гарячих запитів. """
+
+    def test_partial_index_serves_name_filter(self):
+        from .hot_queries import analyze, hot_queries
+
+        reports = {name: analyze(name, queryset) for name, queryset in hot_queries()}
+        self.assertEqual(reports['api.products.filter_name']['full_scans'], [])
+        self.assertIn('product_active_name_idx', ' '.join(reports['api.products.filter_name']['plan']))
+        self.assertTrue(reports['admin.changelist.search']['suggestions'])
+
+    def test_compare_reports_regression(self):
+        import os
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'plans.json')
+            with open(path, 'w', encoding='utf-8') as stream:
+                json.dump({'views.filtered_products': ['SEARCH custom_app_product USING INDEX x (name>?)']}, stream)
+            out = io.StringIO()
+            call_command('explain_hot_queries', '--compare', path, stdout=out)
+        self.assertIn('План змінився: views.filtered_products (регресія)', out.getvalue())
+
+
+class IdempotencyTests(TestCase):
+    """ Тести дедуплікації запитів за заголовком Idempotency-Key. """
+
+    def setUp(self):
+        from django.core.cache import caches
+
+        caches['idempotency'].clear()
+        staff = UserFactory.create(is_staff=True)
+        self.client.force_login(staff)
+
+    def _post(self, data, key):
+        return self.client.post(
+            '/api/products/', data, content_type='application/json', headers={'Idempotency-Key': key}
+        )
+
+    def test_retry_replays_first_response(self):
+        first = self._post({'name': 'product', 'details': {}}, 'key-1')
+        retry = self._post({'name': 'product', 'details': {}}, 'key-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_reused_key_with_other_body_is_rejected(self):
+        self._post({'name': 'product', 'details': {}}, 'key-2')
+        response = self._post({'name': 'other', 'details': {}}, 'key-2')
+        self.assertEqual(response.status_code, 422)
+
+    def test_rejected_request_is_not_cached(self):
+        invalid = self._post({'details': {}}, 'key-3')
+        fixed = self._post({'name': 'product', 'details': {}}, 'key-3')
+
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(fixed.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', fixed)
+        self.assertEqual(Product.objects.count(), 1)
+
+    def _request(self, user, key):
+        from django.test import RequestFactory
+
+        request = RequestFactory().post('/products/create/', {'name': 'x'}, headers={'Idempotency-Key': key})
+        request.user = user
+        return request
+
+    def test_in_flight_duplicate_gets_conflict(self):
+        from django.http import HttpResponse
+        from .idempotency import idempotent_response
+
+        user = UserFactory.create()
+        duplicates = []
+
+        def handler():
+            # Дублікат надходить, поки перший запит ще виконується
+            duplicates.append(idempotent_response(self._request(user, 'key-4'), 'test', handler))
+            return HttpResponse('created', status=201)
+
+        first = idempotent_response(self._request(user, 'key-4'), 'test', handler)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual([r.status_code for r in duplicates], [409])
+
+    def test_anonymous_requests_ignore_key(self):
+        from django.contrib.auth.models import AnonymousUser
+        from django.http import HttpResponse
+        from .idempotency import idempotent_response
+
+        calls = []
+
+        def handler():
+            calls.append(1)
+            return HttpResponse('created', status=201)
+
+        for _ in range(2):
+            response = idempotent_response(self._request(AnonymousUser(), 'key-5'), 'test', handler)
+            self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(len(calls), 2)
+
+
+class SparseFieldsetTests(TestCase):
+    """ Тести `?fields=` / `?omit=` / `?details_keys=` у ProductViewSet. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='product', details={'color': 'red', 'flag': True, 'size': {'w': 1}, 'extra': 'x' * 100}
+        )
+        Review.objects.create(product=cls.product, text='ok', rating=5)
+
+    def test_fields_skip_details_and_reviews_prefetch(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/products/', {'fields': 'name,is_active'})
+        self.assertEqual(response.json(), [{'id': self.product.pk, 'name': 'PRODUCT', 'is_active': True}])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('"details"', ctx.captured_queries[0]['sql'])
+
+    def test_omit(self):
+        response = self.client.get(f'/api/products/{self.product.pk}/', {'omit': 'reviews,details'})
+        self.assertEqual(set(response.json()), {'id', 'name', 'is_active', 'version'})
+        self.assertEqual(response['ETag'], f'"{self.product.pk}-1"')
+
+    def test_details_keys_are_extracted_in_database(self):
+        response = self.client.get('/api/products/', {'fields': 'details', 'details_keys': 'color,flag,size,missing'})
+        self.assertEqual(
+            response.json()[0]['details'],
+            {'color': 'red', 'flag': True, 'size': {'w': 1}, 'missing': None},
+        )
+        single = self.client.get('/api/products/', {'fields': 'details', 'details_keys': 'color'})
+        self.assertEqual(single.json()[0]['details'], {'color': 'red'})
+
+    def test_unknown_field_is_rejected(self):
+        self.assertEqual(self.client.get('/api/products/', {'fields': 'secret'}).status_code, 400)
+
+
+class CatalogueSnapshotTests(TestCase):
+    """ Тести спільного знімка каталогу для ProductViewSet. """
+
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Без фонового потоку: тести перебудовують знімок явно
+        override = override_settings(CATALOGUE_SNAPSHOT={
+            'ENABLED': True, 'PATH': f'{directory.name}/catalogue.snapshot', 'REBUILD_DELAY': None,
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(name='product', details={'color': 'red'})
+            Review.objects.create(product=self.product, text='ok', rating=5)
+            Product.objects.create(name='hidden', is_active=False)
+        # Справжній commit очищує список колбеків, captureOnCommitCallbacks — ні
+        connection.run_on_commit.clear()
+        snapshot.rebuild_pending()
+
+    def test_reads_are_served_without_database(self):
+        with self.assertNumQueries(0):
+            listing = self.client.get('/api/products/', {'fields': 'name,reviews'})
+            detail = self.client.get(f'/api/products/{self.product.pk}/', {'details_keys': 'color,size'})
+
+        self.assertEqual(listing.json(), [{'id': self.product.pk, 'name': 'PRODUCT', 'reviews': [
+            {'id': self.product.reviews.get().pk, 'text': 'ok', 'rating': 5}]}])
+        self.assertEqual(detail.json()['details'], {'color': 'red', 'size': None})
+        self.assertEqual(detail['ETag'], f'"{self.product.pk}-1"')
+
+    def test_snapshot_is_rebuilt_after_commit(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            product.save()
+            Review.objects.create(product=product, text='new', rating=4)
+        self.assertEqual(len(callbacks), 1)
+        # Коміт лише позначає знімок, перебудова — поза запитом
+        self.assertEqual(self.client.get('/api/products/', {'name': 'RENAMED'}).json(), [])
+
+        self.assertEqual(snapshot.rebuild_pending(), {'default': 1})
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', {'name': 'RENAMED'})
+        self.assertEqual(len(response.json()[0]['reviews']), 2)
+
+    def test_records_match_product_serializer(self):
+        from .serializers import ProductSerializer
+
+        Review.objects.create(product=self.product, text='second', rating=3)
+        snapshot.build_snapshot()
+        expected = json.loads(json.dumps(ProductSerializer(Product.objects.get(pk=self.product.pk)).data))
+        self.assertEqual(snapshot.get_snapshot().get(self.product.pk), expected)
+
+    def test_commits_are_coalesced_into_one_rebuild(self):
+        for rating in range(1, 4):
+            with self.captureOnCommitCallbacks(execute=True):
+                Review.objects.create(product=self.product, text='more', rating=rating)
+            connection.run_on_commit.clear()
+        with mock.patch.object(snapshot, 'build_snapshot', return_value=1) as build:
+            snapshot.rebuild_pending()
+        build.assert_called_once_with(using='default')
+
+    def test_rebuild_errors_do_not_propagate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            snapshot.schedule_rebuild('default')
+        with mock.patch.object(snapshot, 'build_snapshot', side_effect=OSError('disk full')):
+            self.assertEqual(snapshot.rebuild_pending(), {})
+
+    def test_generation_is_bumped_once_per_transaction(self):
+        generation = snapshot.current_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Review.objects.create(product=self.product, text='a', rating=1)
+                Review.objects.create(product=self.product, text='b', rating=2)
+        self.assertEqual(snapshot.current_generation(), generation + 1)
+
+        path = snapshot.snapshot_path()
+        snapshot.build_snapshot()
+        self.assertEqual(snapshot.file_generation(path), generation + 1)
+        self.assertEqual(snapshot.get_snapshot().generation, generation + 1)
+
+    def test_older_build_does_not_replace_newer_snapshot(self):
+        path = snapshot.snapshot_path()
+        newer = snapshot.file_generation(path) + 5
+        CatalogueCounter.objects.filter(name=CatalogueCounter.SNAPSHOT_GENERATION).update(value=newer)
+        snapshot.build_snapshot()
+        CatalogueCounter.objects.filter(name=CatalogueCounter.SNAPSHOT_GENERATION).update(value=newer - 1)
+
+        self.assertIsNone(snapshot.build_snapshot())
+        self.assertEqual(snapshot.file_generation(path), newer)
+
+    def test_missing_file_is_not_reopened_on_every_request(self):
+        from django.test import override_settings
+
+        path = f'{snapshot.snapshot_path()}.missing'
+        with override_settings(CATALOGUE_SNAPSHOT={'ENABLED': True, 'PATH': path, 'REBUILD_DELAY': None}):
+            with mock.patch.object(snapshot, 'CatalogueSnapshot', wraps=snapshot.CatalogueSnapshot) as opened:
+                self.assertIsNone(snapshot.get_snapshot())
+                self.assertIsNone(snapshot.get_snapshot())
+                self.assertEqual(opened.call_count, 1)
+                # Побудова у цьому процесі скидає паузу повторних спроб
+                snapshot.build_snapshot()
+                self.assertIsNotNone(snapshot.get_snapshot())
+
+    def test_replaced_snapshot_is_closed(self):
+        old = snapshot.get_snapshot()
+        snapshot.build_snapshot()
+        # Запит, що вже отримав старий знімок, ще може з нього читати
+        self.assertIsNot(snapshot.get_snapshot(), old)
+        self.assertFalse(old._mmap.closed)
+        snapshot.build_snapshot()
+        with mock.patch.object(snapshot.time, 'monotonic', return_value=time.monotonic() + snapshot.RETIRE_AFTER):
+            self.assertIsNot(snapshot.get_snapshot(), old)
+        self.assertTrue(old._mmap.closed)
+
+
+class TracingTests(TestCase):
+    """ Тести трасування запитів (Server-Timing та експорт у файл). """
+
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.export_path = f'{directory.name}/traces.jsonl'
+        override = override_settings(TRACING={'ENABLED': True, 'EXPORT_PATH': self.export_path})
+        override.enable()
+        self.addCleanup(override.disable)
+
+        product = Product.objects.create(name='traced')
+        Review.objects.create(product=product, text='ok', rating=5)
+
+    def test_server_timing_covers_request_layers(self):
+        response = self.client.get('/api/products/')
+        metrics = {entry.split(';')[0] for entry in response['Server-Timing'].split(', ')}
+        self.assertTrue({
+            'http.request', 'middleware.SecurityMiddleware', 'middleware.CustomMetricsMiddleware',
+            'view', 'url.resolve', 'permissions', 'filter', 'serialize', 'db',
+        } <= metrics)
+
+        page = self.client.get(reverse('home'))
+        self.assertIn('template;dur=', page['Server-Timing'])
+
+    def test_spans_are_exported_as_otlp_json(self):
+        trace_id = '4bf92f3577b34da6a3ce929d0e0e4736'
+        self.client.get('/api/products/', HTTP_TRACEPARENT=f'00-{trace_id}-00f067aa0ba902b7-01')
+
+        with open(self.export_path, encoding='utf-8') as stream:
+            exported = json.loads(stream.readline())
+        spans = exported['resourceSpans'][0]['scopeSpans'][0]['spans']
+        span_ids = {span['spanId'] for span in spans}
+
+        root = spans[0]
+        self.assertEqual(root['name'], 'http.request')
+        self.assertEqual(root['parentSpanId'], '00f067aa0ba902b7')
+        self.assertTrue(all(span['traceId'] == trace_id for span in spans))
+        self.assertTrue(all(span['parentSpanId'] in span_ids for span in spans[1:]))
+
+        queries = [span for span in spans if span['name'] == 'db']
+        serialize = next(span for span in spans if span['name'] == 'serialize')
+        # Запити виконуються під час серіалізації (ледачий queryset)
+        self.assertTrue(all(span['parentSpanId'] == serialize['spanId'] for span in queries))
+        self.assertIn({'key': 'http.response.status_code', 'value': {'intValue': '200'}},
+                      root['attributes'])
+
+    def test_disabled_tracing_adds_no_header(self):
+        from django.test import override_settings
+
+        with override_settings(TRACING={'ENABLED': False}):
+            response = self.client.get('/api/products/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_middleware_is_unused_when_disabled_or_async(self):
+        from asgiref.sync import async_to_sync
+        from django.core.exceptions import MiddlewareNotUsed
+        from django.test import override_settings
+        from .tracing import TracingMiddleware
+
+        async def async_handler(request):
+            return None
+
+        with override_settings(TRACING={'ENABLED': False}), self.assertRaises(MiddlewareNotUsed):
+            TracingMiddleware(lambda request: None)
+        # Під ASGI Django передає синхронному middleware AsyncToSync-обгортку
+        with self.assertLogs('custom_app_logger', 'WARNING'), self.assertRaises(MiddlewareNotUsed):
+            TracingMiddleware(async_to_sync(async_handler))
+
+
+def _busy_loop(seconds):
+    """ Навантажує процесор для тестів профайлера. """
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+class SamplingProfilerTests(TestCase):
+    """ Тести статистичного профайлера, ендпоїнта та профілювання запиту. """
+
+    def setUp(self):
+        self.staff = UserFactory.create(is_staff=True)
+        Product.objects.create(name='profiled')
+
+    def test_collapsed_stacks_contain_hot_function(self):
+        import threading
+        from custom_app.profiling import SamplingProfiler
+
+        with SamplingProfiler(0.001, thread_ids={threading.get_ident()}) as profiler:
+            _busy_loop(0.1)
+
+        self.assertGreater(profiler.samples, 0)
+        hot = profiler.stacks.most_common(1)[0][0]
+        self.assertIn('custom_app.tests:_busy_loop', hot.split(';'))
+        stack, count = profiler.collapsed().splitlines()[0].rsplit(' ', 1)
+        self.assertEqual((stack, int(count)), profiler.stacks.most_common(1)[0])
+
+    def test_profile_endpoint_is_staff_only(self):
+        url = reverse('profile')
+        self.assertEqual(self.client.get(url, {'seconds': 0.05}).status_code, 403)
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url, {'seconds': 0.05}).status_code, 501)
+
+        threaded = {'wsgi.multithread': True}
+        response = self.client.get(url, {'seconds': 0.05, 'interval': 0.005, 'output': 'json'}, **threaded)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.json()['samples'], 0)
+        self.assertEqual(self.client.get(url, {'seconds': 3600}, **threaded).status_code, 400)
+
+    def test_single_request_is_profiled_by_header(self):
+        response = self.client.get('/api/products/', HTTP_X_PROFILE='1')
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/products/', HTTP_X_PROFILE='1')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(response['X-Profiled-Status'], '200')
+
+    def test_worker_profiles_itself_on_signal(self):
+        import os
+        import signal
+        import tempfile
+        from django.test import override_settings
+        from custom_app import profiling
+
+        previous = signal.getsignal(signal.SIGURG)
+        self.addCleanup(signal.signal, signal.SIGURG, previous)
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(PROFILING={'SIGNAL_DIR': directory}):
+            self.assertTrue(profiling.install_signal_handler())
+            collapsed = profiling.request_profile(os.getpid(), 0.1, 0.005)
+        self.assertIn('custom_app.profiling:request_profile', collapsed)
+
+    def test_signal_dir_must_be_private(self):
+        import os
+        import tempfile
+        from django.test import override_settings
+        from custom_app import profiling
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(PROFILING={'SIGNAL_DIR': directory}):
+            os.chmod(directory, 0o777)
+            with self.assertRaises(PermissionError):
+                profiling.signal_paths(os.getpid())
+            os.chmod(directory, 0o700)
+            self.assertEqual(os.path.dirname(profiling.signal_paths(1)[0]), directory)
+
+
+class FastTestRunnerTests(TestCase):
+    """ Налаштування тест-раннера діють і в головному процесі, і у воркерах. """
+
+    def test_settings_are_overridden_for_tests_and_workers(self):
+        from django.conf import settings
+        from django.test import override_settings
+        from .testing import FastParallelTestSuite
+
+        self.assertEqual(settings.PASSWORD_HASHERS, ['django.contrib.auth.hashers.MD5PasswordHasher'])
+        self.assertFalse(settings.TRACING['ENABLED'])
+        # Воркер зі spawn стартує з налаштувань проєкту; вихід з override прибирає і хук
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher']):
+            FastParallelTestSuite.process_setup()
+            self.assertEqual(settings.PASSWORD_HASHERS, ['django.contrib.auth.hashers.MD5PasswordHasher'])
+
+
+class ApiAndAdminPerformanceTests(CatalogueTestCase):
+    """ Регресійні тести продуктивності API та адмінки на спільному каталозі. """
+
+    def test_factories_build_related_objects(self):
+        review = ReviewFactory.create()
+        first, second = CustomUserFactory.create(), CustomUserFactory.create()
+
+        self.assertTrue(review.product.pk)
+        self.assertNotEqual(first.phone_number, second.phone_number)
+        self.assertTrue(first.check_password('secret'))
+        self.assertEqual(stats.catalogue_counts()['active'], self.CATALOGUE_PRODUCTS + 1)
+
+    def test_product_list_has_no_n_plus_one(self):
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/products/'),
+            lambda: create_catalogue(products=10, reviews_per_product=5),
+        )
+
+    def test_product_list_fits_budget(self):
+        with self.assertMaxQueries(2), self.assertFasterThan(1000):
+            response = self.client.get('/api/products/')
+        self.assertEqual(len(response.json()), self.CATALOGUE_PRODUCTS)
+
+    def test_admin_changelist_has_no_n_plus_one(self):
+        self.client.force_login(self.staff)
+        url = reverse('admin:custom_app_product_changelist')
+        self.assertConstantQueries(
+            lambda: self.assertEqual(self.client.get(url).status_code, 200),
+            lambda: create_catalogue(products=10),
+        )
+
+
+class ShardingTests(TestCase):
+    """ Тести шардування каталогу за тенантом. """
+    databases = {'default', 'catalogue_1', 'catalogue_2'}
+
+    def setUp(self):
+        self.staff = UserFactory.create(is_staff=True, is_superuser=True)
+
+    def test_tenant_requests_are_routed_to_their_shard(self):
+        self.client.force_login(self.staff)
+        response = self.client.post('/api/products/', {'name': 'tenant one'},
+                                    content_type='application/json', HTTP_X_TENANT='tenant1')
+        self.assertEqual(response.status_code, 201)
+
+        self.assertTrue(Product.objects.using('catalogue_1').filter(name='TENANT ONE').exists())
+        self.assertFalse(Product.objects.using('default').exists())
+        self.assertEqual(len(self.client.get('/api/products/', HTTP_X_TENANT='tenant1').json()), 1)
+        self.assertEqual(self.client.get('/api/products/', HTTP_X_TENANT='tenant2').json(), [])
+        self.assertEqual(self.client.get('/api/products/').json(), [])
+        self.assertEqual(self.client.get('/api/products/', HTTP_X_TENANT='unknown').status_code, 404)
+
+    def test_tenant_header_requires_access(self):
+        from django.contrib.auth.models import Group
+
+        self.assertEqual(self.client.get('/api/products/', HTTP_X_TENANT='tenant1').status_code, 403)
+
+        member = UserFactory.create()
+        member.groups.add(Group.objects.create(name='tenant:tenant1'))
+        self.client.force_login(member)
+        self.assertEqual(self.client.get('/api/products/', HTTP_X_TENANT='tenant1').status_code, 200)
+        self.assertEqual(self.client.get('/api/products/', HTTP_X_TENANT='tenant2').status_code, 403)
+
+    def test_unmigrated_shard_is_rejected(self):
+        from custom_app import sharding
+
+        self.client.force_login(self.staff)
+        with mock.patch.object(sharding, '_migrated_shards', set()), \
+                mock.patch.object(connections['catalogue_2'].introspection, 'table_names', return_value=[]):
+            response = self.client.get('/api/products/', HTTP_X_TENANT='tenant2')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('migrate_shards', response.json()['detail'])
+
+    def test_statistics_follow_the_shard_of_the_instance(self):
+        from custom_app.sharding import use_shard
+
+        product = ProductFactory.build()
+        product.save(using='catalogue_2')
+        ReviewFactory.create(product=product, rating=4)
+
+        with use_shard('catalogue_2'):
+            self.assertEqual(stats.catalogue_counts()['active'], 1)
+            self.assertEqual(stats.rating_histogram()[4], 1)
+        self.assertEqual(stats.catalogue_counts()['active'], 0)
+
+    def test_fan_out_collects_results_from_every_shard(self):
+        from custom_app.sharding import fan_out, use_shard
+
+        with use_shard('catalogue_1'):
+            create_catalogue(products=3, reviews_per_product=0)
+        create_catalogue(products=1, reviews_per_product=0)
+
+        counts = fan_out(lambda alias: Product.objects.count())
+        self.assertEqual(counts, {'default': 1, 'catalogue_1': 3, 'catalogue_2': 0})
+
+        out = io.StringIO()
+        call_command('shard_report', stdout=out)
+        self.assertIn('4', out.getvalue().splitlines()[-1])
+
+    def test_only_catalogue_tables_are_created_in_shards(self):
+        tables = connection.introspection.table_names()
+        shard_tables = connections['catalogue_1'].introspection.table_names()
+
+        self.assertIn('custom_app_product', shard_tables)
+        self.assertNotIn('auth_user', shard_tables)
+        self.assertNotIn('custom_app_customuser', shard_tables)
+        self.assertIn('auth_user', tables)
+
+    def test_admin_switches_shard_through_session(self):
+        self.client.force_login(self.staff)
+        url = reverse('admin:custom_app_product_changelist')
+
+        response = self.client.get(url, {'tenant': 'tenant2'})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertContains(self.client.get(url), 'Шард каталогу: catalogue_2')
+
+    def test_tenant_param_is_validated_and_limited_to_admin(self):
+        self.client.force_login(self.staff)
+        url = reverse('admin:custom_app_product_changelist')
+
+        self.assertEqual(self.client.get(url, {'tenant': 'unknown'}).status_code, 404)
+        self.assertNotIn('tenant', self.client.session)
+
+        response = self.client.get('/api/products/', {'tenant': 'tenant2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('tenant', self.client.session)
@@ -0,0 +1,347 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from inspect import iscoroutinefunction
+from asgiref.sync import AsyncToSync
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+# Налаштування за замовчуванням (перевизначаються словником settings.TRACING)
+DEFAULTS = {
+    'ENABLED': False,
+    'SERVER_TIMING': True,        # додавати заголовок Server-Timing
+    'EXPORT_PATH': None,          # файл для експорту (OTLP JSON, рядок на трейс)
+    'SERVICE_NAME': 'Homework23',
+    'MAX_STATEMENT_LENGTH': 1000,  # обрізання тексту SQL в атрибутах
+}
+
+# W3C Trace Context: version-trace_id-parent_id-flags
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+# Поточний (найглибший відкритий) спан запиту
+_current_span = ContextVar('custom_app_current_span', default=None)
+_export_lock = threading.Lock()
+logger = logging.getLogger('custom_app_logger')
+
+
+def _config():
+    """ Повертає налаштування з урахуванням settings.TRACING. """
+    return {**DEFAULTS, **getattr(settings, 'TRACING', {})}
+
+
+def _new_id(size):
+    """ Випадковий ненульовий ідентифікатор у hex (16 байт — trace, 8 — span). """
+    return os.urandom(size).hex()
+
+
+class Span:
+    """
+    Один інтервал роботи всередині трейсу запиту.
+
+    Час зберігається в наносекундах (`time.time_ns()` для моменту початку і
+    `perf_counter_ns()` для тривалості), як того вимагає формат OpenTelemetry.
+    """
+
+    def __init__(self, name, trace, parent_id=None, attributes=None, kind=SPAN_KIND_INTERNAL):
+        self.name = name
+        self.kind = kind
+        self.trace = trace
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_time_ns = time.time_ns()
+        self._start_counter = time.perf_counter_ns()
+        self.duration_ns = None
+        trace.spans.append(self)
+
+    def end(self):
+        if self.duration_ns is None:
+            self.duration_ns = time.perf_counter_ns() - self._start_counter
+
+    @property
+    def duration_ms(self):
+        return (self.duration_ns or 0) / 1e6
+
+    def to_otlp(self):
+        """ Представлення спану у форматі OTLP JSON. """
+        data = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_time_ns),
+            'endTimeUnixNano': str(self.start_time_ns + (self.duration_ns or 0)),
+            'attributes': [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 0},
+        }
+        if self.parent_id:
+            data['parentSpanId'] = self.parent_id
+        return data
+
+
+class Trace:
+    """ Усі спани одного HTTP-запиту. """
+
+    def __init__(self, trace_id=None, remote_parent_id=None):
+        self.trace_id = trace_id or _new_id(16)
+        self.remote_parent_id = remote_parent_id
+        self.spans = []
+
+    def server_timing(self):
+        """
+        Формує значення заголовка `Server-Timing`.
+
+        Спани з однаковою назвою (наприклад, усі SQL-запити) об'єднуються в
+        одну метрику із сумарною тривалістю та кількістю в описі.
+        """
+        totals = {}
+        for span in self.spans:
+            duration, count = totals.get(span.name, (0.0, 0))
+            totals[span.name] = (duration + span.duration_ms, count + 1)
+        return ', '.join(
+            f'{name};dur={duration:.2f}' + (f';desc="{count}x"' if count > 1 else '')
+            for name, (duration, count) in totals.items()
+        )
+
+    def to_otlp(self, service_name):
+        """ Трейс у форматі OTLP JSON (`ExportTraceServiceRequest`). """
+        return {'resourceSpans': [{
+            'resource': {'attributes': [_otlp_attribute('service.name', service_name)]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [span.to_otlp() for span in self.spans],
+            }],
+        }]}
+
+
+def _otlp_attribute(key, value):
+    """ Перетворює пару ключ/значення на атрибут OTLP (`AnyValue`). """
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Відкриває вкладений спан у поточному трейсі.
+
+    Поза трейсом (трасування вимкнене або код виконується не в запиті)
+    нічого не записує, тож інструментування можна залишати в коді постійно.
+
+    :param name: Назва спану (вона ж — назва метрики в Server-Timing).
+    :param attributes: Атрибути спану.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    current = Span(name, parent.trace, parent.span_id, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as exc:
+        current.error = f'{type(exc).__name__}: {exc}'
+        raise
+    finally:
+        current.end()
+        _current_span.reset(token)
+
+
+def traced(name, function, **attributes):
+    """ Обгортає виклик функції у спан. """
+    def wrapper(*args, **kwargs):
+        with span(name, **attributes):
+            return function(*args, **kwargs)
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def current_span():
+    """ Повертає поточний спан (None поза трейсом). """
+    return _current_span.get()
+
+
+# --- Експорт ---
+def export_to_file(trace, path, service_name):
+    """
+    Дописує трейс у файл одним рядком OTLP JSON.
+
+    Такий формат читає `otlpjsonfile` receiver OpenTelemetry Collector,
+    тож файл можна переслати в Jaeger/Tempo без змін.
+    """
+    line = json.dumps(trace.to_otlp(service_name), ensure_ascii=False, separators=(',', ':'))
+    with _export_lock, open(path, 'a', encoding='utf-8') as stream:
+        stream.write(line + '\n')
+
+
+# --- Інструментування ---
+def _sql_span(execute, sql, params, many, context):
+    """ `execute_wrapper`, що створює спан на кожен SQL-запит. """
+    connection = context['connection']
+    limit = _config()['MAX_STATEMENT_LENGTH']
+    with span('db', **{
+        'db.system': connection.vendor,
+        'db.namespace': connection.alias,
+        'db.query.text': sql[:limit],
+        'db.operation.batch': many,
+    }):
+        return execute(sql, params, many, context)
+
+
+class TracingMiddleware:
+    """
+    Middleware, що трасує запит і віддає спани через Server-Timing та файл.
+
+    Має стояти першим у MIDDLEWARE: під час ініціалізації проходить по
+    ланцюжку наступних middleware цього обробника і обгортає кожен виклик
+    `get_response` у спан `middleware.<Клас>`, а фінальний обробник — у
+    спан `view`. Час розв'язання URL (`url.resolve`) вимірюється від початку
+    `view` до виклику `process_view`, без змін у класах Django. SQL-запити
+    трасуються через `execute_wrapper` на всіх з'єднаннях.
+
+    Вмикається `settings.TRACING['ENABLED']`; коли вимкнено, Django
+    прибирає middleware з ланцюжка (`MiddlewareNotUsed`). Працює лише під
+    WSGI: в асинхронному ланцюжку (ASGI) теж не використовується.
+    """
+
+    def __init__(self, get_response):
+        if not _config()['ENABLED']:
+            raise MiddlewareNotUsed('Трасування вимкнено (TRACING["ENABLED"]).')
+        self.get_response = self._instrument_chain(get_response)
+
+    @staticmethod
+    def _instrument_chain(get_response):
+        """
+        Обгортає спанами кожну ланку ланцюжка middleware.
+
+        Django загортає кожен middleware у `convert_exception_to_response`,
+        що зберігає екземпляр у `__wrapped__`; сам екземпляр тримає
+        наступну ланку в атрибуті `get_response`. Останньою ланкою є метод
+        обробника (`BaseHandler._get_response`).
+
+        :raises MiddlewareNotUsed: Якщо ланцюжок асинхронний (ASGI).
+        """
+        first, owner, handler = None, None, get_response
+        while True:
+            target = getattr(handler, '__wrapped__', handler)
+            if isinstance(target, AsyncToSync) or iscoroutinefunction(target):
+                logger.warning('TracingMiddleware підтримує лише WSGI: під ASGI трасування вимкнено.')
+                raise MiddlewareNotUsed('TracingMiddleware підтримує лише WSGI.')
+            terminal = getattr(target, '__self__', None)
+            is_terminal = terminal is not None and hasattr(terminal, 'resolve_request')
+            wrapped = traced('view' if is_terminal else f'middleware.{type(target).__name__}', handler)
+
+            if owner is None:
+                first = wrapped
+            else:
+                owner.get_response = wrapped
+            next_handler = getattr(target, 'get_response', None)
+            if is_terminal or not callable(next_handler):
+                break
+            owner, handler = target, next_handler
+        return first
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """
+        Записує спан `url.resolve`: від початку `view` (перед розв'язанням
+        URL у Django) до цього моменту (URL уже розв'язано).
+        """
+        parent = _current_span.get()
+        if parent is not None and parent.name == 'view':
+            resolve = Span('url.resolve', parent.trace, parent.span_id)
+            resolve.start_time_ns = parent.start_time_ns
+            resolve.duration_ns = time.perf_counter_ns() - parent._start_counter
+        return None
+
+    def __call__(self, request):
+        config = _config()
+        if not config['ENABLED']:
+            return self.get_response(request)
+
+        match = TRACEPARENT_RE.match(request.headers.get('traceparent', ''))
+        trace = Trace(*match.groups()) if match else Trace()
+        root = Span('http.request', trace, trace.remote_parent_id, {
+            'http.request.method': request.method,
+            'url.path': request.path,
+        }, kind=SPAN_KIND_SERVER)
+        token = _current_span.set(root)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_sql_span))
+                response = self.get_response(request)
+        finally:
+            root.end()
+            _current_span.reset(token)
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is not None and resolver_match.route:
+            root.attributes['http.route'] = resolver_match.route
+        root.attributes['http.response.status_code'] = response.status_code
+
+        if config['SERVER_TIMING']:
+            response['Server-Timing'] = trace.server_timing()
+        if config['EXPORT_PATH']:
+            export_to_file(trace, config['EXPORT_PATH'], config['SERVICE_NAME'])
+        return response
+
+
+class TracedViewMixin:
+    """
+    Домішка для DRF-представлень: спани для перевірки дозволів і фільтрації.
+    """
+
+    def check_permissions(self, request):
+        with span('permissions', **{'permission.classes': ','.join(
+                cls.__name__ for cls in self.permission_classes)}):
+            return super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with span('permissions'):
+            return super().check_object_permissions(request, obj)
+
+    def filter_queryset(self, queryset):
+        with span('filter', **{'filter.backends': ','.join(
+                backend.__name__ for backend in self.filter_backends)}):
+            return super().filter_queryset(queryset)
+
+
+class TracedTemplate(Template):
+    """ Шаблон, рендеринг якого записується у спан `template`. """
+
+    def render(self, context=None, request=None):
+        with span('template', **{'template.name': self.origin.template_name or ''}):
+            return super().render(context, request)
+
+
+class TracedDjangoTemplates(DjangoTemplates):
+    """
+    Бекенд шаблонів Django, що повертає `TracedTemplate`.
+
+    Підключається в TEMPLATES['BACKEND'] і поводиться як стандартний
+    `DjangoTemplates`; поза трейсом спани не створюються.
+    """
+
+    def from_string(self, template_code):
+        return TracedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TracedTemplate(super().get_template(template_name).template, self)
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import HomePageView, ProductViewSet, ProductCreateView
+from .views import HomePageView, ProductViewSet, ProductCreateView, StatsView, ProfileView
 
 
 router = DefaultRouter()
@@ -9,5 +9,7 @@ router.register(r'products', ProductViewSet)
 urlpatterns = [
     path('', HomePageView.as_view(), name='home'),
     path('products/create/', ProductCreateView.as_view(), name='product_create'),
+    path('api/stats/', StatsView.as_view(), name='stats'),
+    path('api/profile/', ProfileView.as_view(), name='profile'),
     path('api/', include(router.urls)),
 ]
\ No newline at end of file
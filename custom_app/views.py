@@ -1,41 +1,77 @@
 from django.views.generic import TemplateView
 from django.shortcuts import render, redirect
 from django.views import View
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets
+from rest_framework import permissions
+from rest_framework.decorators import action
+from rest_framework.exceptions import MethodNotAllowed, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from .serializers import ProductSerializer
+import json
+import re
+import threading
+from .serializers import ProductSerializer, ArchivedProductSerializer
 from .permissions import IsAdminOrReadOnly
-from .models import Product
-from .forms import ProductForm
+from .models import Product, ConcurrentUpdateError
+from .exceptions import Conflict, PreconditionFailed, ProfilingUnavailable
+from .tracing import TracedViewMixin
 
 from django.db.models import Count, Q
+from django.utils.dateparse import parse_date
 
 # Кастомні запити через ORM
-# Кастомний запит через ORM: Знайти активні продукти, які мають більше 10 відгуків
-high_rated_products = Product.objects.filter(is_active=True).annotate(
-    review_count=Count('reviews')
-).filter(review_count__gt=10)
-"""
-ORM-запит: Знайти активні продукти (`is_active=True`),
-які мають більше 10 відгуків.
-
-Використовує:
-1. `filter()` для фільтрації за полем моделі.
-2. `annotate()` для обчислення агрегованого значення (`review_count` - кількість відгуків).
-3. `filter()` для фільтрації за обчисленим значенням (`review_count__gt=10`).
-"""
-
-# Продукти, назва яких починається з "A" або "B"
-filtered_products = Product.objects.filter(
-    Q(name__startswith='A') | Q(name__startswith='B')
-)
-"""
-ORM-запит: Знайти продукти, назва яких починається з 'A' АБО з 'B'.
-
-Використовує:
-1. Об'єкти `Q` для побудови складних логічних умов (оператор OR, `|`).
-2. Оператор `__startswith` для пошуку за префіксом.
-"""
+# Запити будуються ліниво (при першому зверненні до атрибута модуля),
+# щоб імпорт views не компілював їх під час старту процесу.
+def _build_high_rated_products():
+    """
+    ORM-запит: Знайти активні продукти (`is_active=True`),
+    які мають більше 10 відгуків.
+
+    Використовує:
+    1. `filter()` для фільтрації за полем моделі.
+    2. `annotate()` для обчислення агрегованого значення (`review_count` - кількість відгуків).
+    3. `filter()` для фільтрації за обчисленим значенням (`review_count__gt=10`).
+    """
+    return Product.objects.filter(is_active=True).annotate(
+        review_count=Count('reviews')
+    ).filter(review_count__gt=10)
+
+
+def _build_filtered_products():
+    """
+    ORM-запит: Знайти продукти, назва яких починається з 'A' АБО з 'B'.
+
+    Використовує:
+    1. Об'єкти `Q` для побудови складних логічних умов (оператор OR, `|`).
+    2. Оператор `__startswith` для пошуку за префіксом.
+    """
+    return Product.objects.filter(
+        Q(name__startswith='A') | Q(name__startswith='B')
+    )
+
+
+_LAZY_QUERYSETS = {
+    'high_rated_products': _build_high_rated_products,
+    'filtered_products': _build_filtered_products,
+}
+
+
+def __getattr__(name):
+    """
+    Лінивий доступ до `high_rated_products` та `filtered_products`.
+
+    QuerySet будується при першому зверненні та зберігається в модулі,
+    тому наступні звернення не викликають цю функцію.
+    """
+    try:
+        factory = _LAZY_QUERYSETS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    queryset = globals()[name] = factory()
+    return queryset
+
 
 def product_create_view(request):
     """
@@ -44,6 +80,8 @@ def product_create_view(request):
     :param request: Об'єкт HttpRequest.
     :return: Об'єкт HttpResponse, що рендерить шаблон `product_form.html`.
     """
+    from .forms import ProductForm
+
     form = ProductForm()
     return render(request, 'product_form.html', {'form': form})
 
@@ -71,7 +109,6 @@ class HomePageView(TemplateView):
 
 
 # Класове відображення для обробки форми
-from django.template.loader import get_template
 class ProductCreateView(View):
     """
     Класове відображення на основі базового View для обробки форми створення продукту.
@@ -84,6 +121,8 @@ class ProductCreateView(View):
 
         :return: HttpResponse з формою.
         """
+        from .forms import ProductForm
+
         form = ProductForm()
         return render(request, 'product_form.html', {'form': form})
 
@@ -93,9 +132,18 @@ class ProductCreateView(View):
 
         Якщо форма дійсна, зберігає об'єкт і перенаправляє користувача.
         Якщо недійсна, повторно відображає форму з помилками.
+        Повторні запити з тим самим `Idempotency-Key` не створюють дублікатів.
 
         :return: HttpResponse (або редирект).
         """
+        from .idempotency import idempotent_response
+
+        return idempotent_response(request, 'products.create', lambda: self._create(request))
+
+    def _create(self, request):
+        """ Валідує форму та створює продукт (одна спроба). """
+        from .forms import ProductForm
+
         form = ProductForm(request.POST)
         if form.is_valid():
             # Тут спрацюють: UpperCaseCharField.pre_save та validate_no_bad_words
@@ -106,7 +154,7 @@ class ProductCreateView(View):
 
 
 # Viewset із фільтрацією та кастомними дозволами
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(TracedViewMixin, viewsets.ModelViewSet):
     """
     ViewSet для моделі Product.
 
@@ -118,6 +166,15 @@ class ProductViewSet(viewsets.ModelViewSet):
     2. Попереднє завантаження пов'язаних об'єктів (`reviews`).
     3. Кастомні дозволи (тільки адміністратор може змінювати дані).
     4. Фільтрація за допомогою `DjangoFilterBackend`.
+    5. Читання архіву (`?archived=true`): ті самі list/retrieve, але з
+       архівних таблиць і лише для читання.
+    6. Sparse fieldsets для GET: `?fields=id,name` або `?omit=details,reviews`
+       перетворюються на `.only()` і пропуск prefetch відгуків, а
+       `?details_keys=a,b` витягує лише вказані ключі `details` у базі.
+    7. Якщо ввімкнено `CATALOGUE_SNAPSHOT`, list/retrieve обслуговуються
+       зі спільного memory-mapped знімка без запитів до SQLite.
+    8. Перевірка дозволів і фільтрація записуються у спани трасування.
+    9. `export/` — потоковий експорт у JSON Lines через `ProductRow`.
     """
     queryset = Product.objects.filter(is_active=True).prefetch_related('reviews')
     serializer_class = ProductSerializer
@@ -128,3 +185,373 @@ class ProductViewSet(viewsets.ModelViewSet):
     # Фільтрація
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['name', 'is_active']
+
+    # Поля, які завжди повертаються у sparse-відповіді
+    REQUIRED_FIELDS = ('id',)
+    # Максимальна кількість ключів у `?details_keys=`
+    MAX_DETAILS_KEYS = 20
+    DETAILS_KEY_RE = re.compile(r'^[\w-]+$')
+    # Параметри запиту, які вміє обробити знімок каталогу
+    SNAPSHOT_PARAMS = {'name', 'is_active', 'fields', 'omit', 'details_keys', 'format'}
+    BOOLEAN_VALUES = {'true': True, 'True': True, '1': True, 'false': False, 'False': False, '0': False}
+
+    def is_archive_request(self):
+        """ Чи запитує клієнт архівні продукти (`?archived=true`). """
+        return self.request.query_params.get('archived', '').lower() in ('1', 'true', 'yes')
+
+    def initial(self, request, *args, **kwargs):
+        """ Дозволяє лише персоналу читати архівні продукти і забороняє їх зміну. """
+        super().initial(request, *args, **kwargs)
+        if not self.is_archive_request():
+            return
+        if not (request.user and request.user.is_staff):
+            self.permission_denied(request, message='Архівні продукти доступні лише персоналу.')
+        if request.method not in permissions.SAFE_METHODS:
+            raise MethodNotAllowed(request.method, detail='Архівні продукти доступні лише для читання.')
+
+    def _param_list(self, name):
+        """ Розбирає параметр запиту зі списком через кому (None, якщо його немає). """
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+    def sparse_fields(self):
+        """
+        Повертає набір полів, запитаних через `?fields=` / `?omit=`.
+
+        Застосовується лише до безпечних (GET) запитів звичайного каталогу.
+
+        :return: Кортеж (поля або None, ключі details або None).
+        :raises ValidationError: Якщо запитано невідоме поле або некоректний ключ.
+        """
+        if self.request.method not in permissions.SAFE_METHODS or self.is_archive_request():
+            return None, None
+
+        available = ProductSerializer.Meta.fields
+        fields = self._param_list('fields')
+        omit = self._param_list('omit')
+        unknown = set(fields or ()) | set(omit or ())
+        unknown -= set(available)
+        if unknown:
+            raise ValidationError({'fields': f'Невідомі поля: {", ".join(sorted(unknown))}.'})
+
+        selected = None
+        if fields is not None or omit is not None:
+            selected = set(fields) if fields is not None else set(available)
+            selected = (selected - set(omit or ())) | set(self.REQUIRED_FIELDS)
+
+        details_keys = self._param_list('details_keys')
+        if details_keys is not None:
+            if len(details_keys) > self.MAX_DETAILS_KEYS or not all(
+                    self.DETAILS_KEY_RE.match(key) for key in details_keys):
+                raise ValidationError({'details_keys': 'Некоректний список ключів details.'})
+            details_keys = list(dict.fromkeys(details_keys)) or None
+        return selected, details_keys
+
+    def get_queryset(self):
+        """
+        Повертає архівні продукти для `?archived=true`, інакше — активні.
+
+        Для sparse-запитів завантажує лише потрібні колонки та пропускає
+        prefetch відгуків, якщо поле `reviews` не запитане.
+        """
+        if self.is_archive_request():
+            from .archive import archived_products
+
+            return archived_products()
+        queryset = super().get_queryset()
+
+        fields, details_keys = self.sparse_fields()
+        if fields is not None:
+            if 'reviews' not in fields:
+                queryset = queryset.prefetch_related(None)
+            model_fields = [name for name in fields if name not in ('reviews', 'details')]
+            if 'details' in fields and not details_keys:
+                model_fields.append('details')
+            queryset = queryset.only(*model_fields)
+        if details_keys and (fields is None or 'details' in fields):
+            queryset = queryset.with_details_keys(details_keys)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        """ Передає серіалізатору sparse-набір полів та ключі details. """
+        if self.get_serializer_class() is ProductSerializer:
+            fields, details_keys = self.sparse_fields()
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('details_keys', details_keys)
+        return super().get_serializer(*args, **kwargs)
+
+    def snapshot_for_request(self):
+        """
+        Повертає знімок каталогу, якщо ним можна обслужити поточний GET-запит.
+
+        :return: `CatalogueSnapshot` або None (тоді запит іде в базу).
+        """
+        params = self.request.query_params
+        if self.is_archive_request() or set(params) - self.SNAPSHOT_PARAMS:
+            return None
+        if 'is_active' in params and params['is_active'] not in self.BOOLEAN_VALUES:
+            return None
+        from .snapshot import get_snapshot
+
+        return get_snapshot()
+
+    def shape_record(self, record):
+        """ Застосовує sparse fieldsets та `details_keys` до запису зі знімка. """
+        fields, details_keys = self.sparse_fields()
+        if details_keys and 'details' in record:
+            details = record['details'] if isinstance(record['details'], dict) else {}
+            record['details'] = {key: details.get(key) for key in details_keys}
+        if fields is not None:
+            record = {name: value for name, value in record.items() if name in fields}
+        return record
+
+    def list(self, request, *args, **kwargs):
+        """ Повертає список продуктів (зі знімка, якщо він доступний). """
+        snapshot = self.snapshot_for_request()
+        if snapshot is None:
+            return super().list(request, *args, **kwargs)
+        # У знімку лише активні продукти, як і в основному queryset
+        if not self.BOOLEAN_VALUES.get(request.query_params.get('is_active', 'true')):
+            return Response([])
+        records = snapshot.list(name=request.query_params.get('name'))
+        return Response([self.shape_record(record) for record in records])
+
+    def get_serializer_class(self):
+        """ Використовує окремий серіалізатор для архівних продуктів. """
+        if self.is_archive_request():
+            return ArchivedProductSerializer
+        return super().get_serializer_class()
+
+    @staticmethod
+    def etag(product_data):
+        """ Формує ETag продукту з його id та номера версії (None, якщо версію не запитано). """
+        if 'version' not in product_data:
+            return None
+        return f'"{product_data["id"]}-{product_data["version"]}"'
+
+    def if_match_version(self):
+        """
+        Розбирає заголовок `If-Match` у номер версії.
+
+        Підтримуються ETag виду `"<id>-<version>"` (у т.ч. слабкі `W/...`)
+        та просто номер версії. `*` або відсутній заголовок — без перевірки.
+
+        :return: Очікуваний номер версії або None.
+        :raises PreconditionFailed: Якщо заголовок не вдається розібрати.
+        """
+        header = self.request.headers.get('If-Match', '').strip()
+        if not header or header == '*':
+            return None
+        tag = header.split(',')[0].strip().removeprefix('W/').strip('"')
+        try:
+            return int(tag.rsplit('-', 1)[-1])
+        except ValueError:
+            raise PreconditionFailed('Некоректний заголовок If-Match.')
+
+    def check_version(self, instance):
+        """
+        Перевіряє передумову `If-Match` для об'єкта.
+
+        :return: Очікуваний номер версії або None, якщо заголовка немає.
+        :raises PreconditionFailed: Якщо версія об'єкта вже інша.
+        """
+        expected = self.if_match_version()
+        if expected is not None and expected != instance.version:
+            raise PreconditionFailed()
+        return expected
+
+    def create(self, request, *args, **kwargs):
+        """
+        Створює продукт (POST).
+
+        Повторні запити з тим самим `Idempotency-Key` отримують збережену
+        відповідь першого запиту замість створення дубліката.
+        """
+        from .idempotency import idempotent_response
+
+        return idempotent_response(
+            request, 'api.products.create', lambda: super(ProductViewSet, self).create(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Повертає продукт разом із заголовком ETag.
+
+        Якщо продукт є у знімку каталогу, база не використовується; інакше
+        (або якщо знімок ще не встиг оновитися) — звичайний запит до бази.
+        """
+        snapshot = self.snapshot_for_request()
+        record = None
+        if snapshot is not None and str(kwargs.get('pk', '')).isdigit():
+            record = snapshot.get(int(kwargs['pk']))
+        if record is not None:
+            response = Response(self.shape_record(record))
+        else:
+            response = super().retrieve(request, *args, **kwargs)
+        etag = self.etag(response.data)
+        if etag:
+            response['ETag'] = etag
+        return response
+
+    def update(self, request, *args, **kwargs):
+        """ Оновлює продукт (PUT/PATCH) та повертає новий ETag. """
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = self.etag(response.data)
+        return response
+
+    def perform_update(self, serializer):
+        """
+        Зберігає зміни з перевіркою версії.
+
+        Записуються лише змінені колонки; якщо паралельний запис встиг
+        змінити продукт, повертається 409 Conflict.
+        """
+        expected = self.check_version(serializer.instance)
+        if expected is not None:
+            serializer.instance.expect_version(expected)
+        try:
+            serializer.save()
+        except ConcurrentUpdateError:
+            raise Conflict()
+
+    def perform_destroy(self, instance):
+        """ Видаляє продукт після перевірки передумови `If-Match`. """
+        self.check_version(instance)
+        instance.delete()
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Потоково віддає активні продукти у форматі JSON Lines (`/api/products/export/`).
+
+        Рядки читаються курсором пакетами як `ProductRow` і серіалізуються
+        через `ProductRow.as_dict()`, без екземплярів моделі та полів DRF,
+        тому пам'ять не залежить від розміру каталогу. Підтримує ті самі
+        фільтри `name` та `is_active`, що й список.
+
+        :return: StreamingHttpResponse (`application/x-ndjson`).
+        """
+        from .readmodels import iter_product_rows
+
+        queryset = self.filter_queryset(Product.objects.filter(is_active=True))
+        # Генератор виконується після виходу з TenantMiddleware: шард фіксується зараз
+        queryset = queryset.using(queryset.db)
+        lines = (json.dumps(row.as_dict(), ensure_ascii=False) + '\n' for row in iter_product_rows(queryset))
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson; charset=utf-8')
+
+
+# API статистики каталогу
+class StatsView(APIView):
+    """
+    API-відображення статистики каталогу (`/api/stats/`).
+
+    Читає лише rollup-таблиці (див. `custom_app.stats`), тому не виконує
+    GROUP BY по таблицях продуктів та відгуків.
+
+    Параметри запиту:
+    1. `bucket` — інтервал групування створених продуктів: day, week, month.
+    2. `since` / `until` — межі діапазону дат (YYYY-MM-DD, включно).
+    3. `top` — кількість продуктів у рейтингу за кількістю відгуків.
+    """
+    permission_classes = [IsAdminOrReadOnly]
+
+    # Максимальна кількість продуктів у рейтингу
+    MAX_TOP = 100
+
+    def get(self, request):
+        """
+        Повертає лічильники, динаміку створення, гістограму рейтингів
+        та рейтинг продуктів.
+
+        :return: Response зі статистикою.
+        """
+        from . import stats
+
+        params = request.query_params
+        bucket = params.get('bucket', 'day')
+        if bucket not in stats.BUCKETS:
+            raise ValidationError({'bucket': f'Допустимі значення: {", ".join(stats.BUCKETS)}.'})
+        since = self._parse_date(params, 'since')
+        until = self._parse_date(params, 'until')
+        try:
+            top = max(0, min(int(params.get('top', 10)), self.MAX_TOP))
+        except ValueError:
+            raise ValidationError({'top': 'Очікується ціле число.'})
+
+        return Response({
+            'products': stats.catalogue_counts(),
+            'created': stats.created_per_bucket(bucket, since, until),
+            'ratings': stats.rating_histogram(),
+            'top_products': stats.top_products(top),
+        })
+
+    @staticmethod
+    def _parse_date(params, name):
+        """ Розбирає параметр дати або повертає None, якщо його немає. """
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Очікується дата у форматі YYYY-MM-DD.'})
+        return parsed
+
+
+# Статистичний профайлер робочого процесу
+class ProfileView(APIView):
+    """
+    Профілювання робочого процесу «наживо» (`/api/profile/`, лише персонал).
+
+    Протягом `seconds` секунд фоновий потік знімає стеки всіх потоків
+    процесу (крім потоку цього запиту) і повертає їх у форматі collapsed
+    stacks, готовому для flamegraph.pl/speedscope.
+
+    Параметри запиту:
+    1. `seconds` — тривалість профілювання (за замовчуванням 5).
+    2. `interval` — період вибірки в секундах (за замовчуванням PROFILING['INTERVAL']).
+    3. `output` — `collapsed` (text/plain) або `json`.
+
+    Потребує багатопотокового WSGI-воркера (`wsgi.multithread`): в
+    однопотоковому (sync gunicorn, ASGI з потоком для синхронних view)
+    інші запити чекають на цей, і стеки були б порожні — тоді повертається
+    501, а процес можна профілювати командою `profile_worker <pid>`.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        """
+        Запускає профайлер і повертає зібрані стеки.
+
+        :return: HttpResponse (collapsed) або Response (json).
+        """
+        from . import profiling
+
+        if not request.META.get('wsgi.multithread', False):
+            raise ProfilingUnavailable()
+        params = request.query_params
+        try:
+            seconds = float(params.get('seconds', 5))
+            interval = float(params['interval']) if 'interval' in params else None
+        except ValueError:
+            raise ValidationError({'seconds': 'Очікується число секунд.'})
+        output = params.get('output', 'collapsed')
+        if output not in ('collapsed', 'json'):
+            raise ValidationError({'output': 'Допустимі значення: collapsed, json.'})
+        if interval is not None and not 0 < interval <= 1:
+            raise ValidationError({'interval': 'Період вибірки має бути в межах (0, 1] с.'})
+
+        try:
+            profiler = profiling.profile_for(seconds, interval, exclude={threading.get_ident()})
+        except ValueError as exc:
+            raise ValidationError({'seconds': str(exc)})
+
+        if output == 'json':
+            return Response(profiler.as_dict())
+        response = HttpResponse(profiler.collapsed(), content_type='text/plain; charset=utf-8')
+        response['X-Profile-Samples'] = str(profiler.samples)
+        return response
@@ -0,0 +1,49 @@
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+from . import snapshot
+from .sharding import shard_aliases
+
+# Шаблони, які рендеряться на кожному типовому запиті
+WARMUP_TEMPLATES = ('base.html', 'home.html', 'product_form.html', 'widgets/custom_select.html')
+
+
+def warm_up():
+    """
+    Прогріває процес перед розгалуженням (fork) воркерів.
+
+    Викликається один раз у головному процесі (хук gunicorn `when_ready`
+    при `--preload`, див. Homework23/wsgi.py), щоб дочірні воркери отримали
+    вже заповнені структури через copy-on-write:
+
+    1. URL-резолвер (імпорт URLconf, DRF-роутера та views).
+    2. Кешований завантажувач шаблонів (компіляція шаблонів).
+    3. Поля серіалізаторів та модуль форм.
+    4. Спільні знімки каталогів усіх шардів (якщо ввімкнено): будуються,
+       якщо їх ще немає, і відображаються у пам'ять.
+
+    Наприкінці закриває з'єднання з базою, щоб воркери не успадкували
+    спільний дескриптор SQLite.
+
+    Функція синхронна: з ASGI-модуля її не викликають, бо там вона може
+    виконуватися в циклі подій (SynchronousOnlyOperation).
+    """
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver._populate()
+
+    for template_name in WARMUP_TEMPLATES:
+        get_template(template_name)
+
+    from .serializers import ProductSerializer
+    from . import forms  # noqa: F401
+
+    ProductSerializer().fields
+
+    if snapshot.is_enabled():
+        for alias in shard_aliases():
+            if snapshot.get_snapshot(alias) is None:
+                snapshot.build_snapshot(using=alias)
+                snapshot.get_snapshot(alias)
+
+    connections.close_all()